@@ -49,6 +49,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'myapp.profiling.RequestProfilerMiddleware',
+    'myapp.metrics.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'conf.urls'
@@ -57,17 +59,115 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'myapp.context_processors.fragment_cache',
+            ],
+            # コンパイル済みテンプレートをプロセス内にキャッシュする
+            # （DEBUG 中は Django がファイル変更を検知してキャッシュを破棄する）
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
 ]
 
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# テンプレートフラグメント（ミッション状況・ポイント・ホテルランキング）を保存する。
+# 複数ワーカーで無効化を共有するため、本番では REDIS_URL で共有キャッシュを指定する。
+#
+# テンプレートフラグメントキャッシュの有効期間（秒）
+# ・共有キャッシュ（Redis）では無効化が全ワーカーに届くので長く持つ
+# ・LocMem はワーカーごとのキャッシュで、ミッション達成時の無効化は処理したワーカーにしか
+#   届かない。他のワーカーが古いポイントを表示し続けないよう短くする
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+    FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'myapp',
+        }
+    }
+    FRAGMENT_CACHE_TIMEOUT = 30
+
+# リクエストプロファイラ（/admin/profiles/ で確認）
+# ・スタッフは ?_profile=1 で任意のリクエストを cProfile 計測できる
+# ・スタッフのリクエストは SAMPLE_RATE の割合でプロファイルを保存
+# ・閾値を超えたリクエストは所要時間を記録（プロファイルは取らない）
+# デフォルトは無効。必要なときだけ PROFILER_ENABLED=1 で有効にする
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+PROFILER_SLOW_THRESHOLD_MS = 1000
+PROFILER_SAMPLE_RATE = 0.01
+PROFILER_MAX_ENTRIES = 200
+PROFILER_DIR = BASE_DIR / 'profiles'
+
+# メトリクス（/internal/metrics/ で Prometheus 形式で公開）
+# 各ワーカーは METRICS_FLUSH_INTERVAL 秒ごとに METRICS_DIR へ値を書き出し、公開時に合算する
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', BASE_DIR / 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+# /internal/metrics/ へのアクセス許可
+# ・METRICS_TOKEN を設定すると Authorization: Bearer <token> で取得できる（推奨）
+# ・METRICS_ALLOWED_IPS は REMOTE_ADDR で判定する。リバースプロキシの後ろでは全リクエストが
+#   プロキシのアドレス（127.0.0.1 など）になり誰でも見られてしまうので、アプリに直接
+#   つなぐ別ポートで待ち受けている場合だけ指定すること
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip
+]
+
+# 楽天 API 検索結果のキャッシュ有効期間（秒）
+SEARCH_CACHE_TIMEOUT = 60 * 10
+
+# 楽天 API が失敗したとき
+# ・失敗結果をこの秒数だけキャッシュし、同じ検索で API を待たせない
+# ・最後に成功した結果はこの秒数だけ保持し、失敗時の代わりに表示する
+SEARCH_NEGATIVE_CACHE_TIMEOUT = 30
+SEARCH_STALE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# サーキットブレーカー：連続失敗回数と、open にしてから試しに呼び出すまでの秒数
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+
+# 頻出キーワード集計：プロセス内で保持するキーワード数と DB への反映間隔（秒）
+KEYWORD_TRACKER_CAPACITY = 200
+KEYWORD_TRACKER_FLUSH_INTERVAL = 60
+
+# /go/rakuten/ のクリック制限：ユーザーごとに MISSION_CLICK_RATE_WINDOW 秒あたりの回数
+# （超えた分はリダイレクトだけ行い、ミッション処理はしない）
+MISSION_CLICK_RATE_LIMIT = 10
+MISSION_CLICK_RATE_WINDOW = 60
+
+# 入力補完：エンドポイントごとに保持する候補数
+AUTOCOMPLETE_CAPACITY = 5000
+
+# キャッシュ事前ウォーム：エンドポイントごとの上位件数と集計対象期間（日）
+SEARCH_WARM_TOP_N = 20
+SEARCH_WARM_WINDOW_DAYS = 7
+
+# ホテル・商品画像プロキシのディスクキャッシュ（LRU で上限まで保持）
+IMAGE_PROXY_CACHE_DIR = BASE_DIR / 'image_cache'
+IMAGE_PROXY_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# 画像取得関数（テストではスタブに差し替える）
+IMAGE_PROXY_FETCHER = 'myapp.services.image_proxy.fetch_remote_image'
+
 WSGI_APPLICATION = 'conf.wsgi.application'
 
 
@@ -82,6 +182,21 @@ DATABASES = {
 }
 
 
+# Sessions / Authentication
+#
+# セッションはキャッシュ優先で読み（ミス時のみ DB）、ユーザーはプロフィールと
+# 一緒に 1 クエリで読み込む。
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# ModelBackend は、切り替え前にログインしたセッション（保存されているバックエンドが
+# ModelBackend のもの）を無効にしないために残している。ログインし直せば ProfileModelBackend になる
+AUTHENTICATION_BACKENDS = [
+    'myapp.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -118,6 +233,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic の出力先
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# 本番ではハッシュ付きファイル名 + 事前圧縮 + WebP 生成を行うストレージを使う
+# （python manage.py collectstatic で生成。DEBUG 中は元ファイルをそのまま配信）
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage'
+            if DEBUG
+            else 'myapp.storage.PrecompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,15 +14,39 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib.auth import views as auth_views
 
+from myapp import admin_views
+from myapp.views import metrics_view
+from myapp.static_serve import serve_static
+
 urlpatterns = [
+    # Request profiles (must come before the admin catch-all)
+    path('admin/profiles/', admin_views.profile_list, name='admin_profile_list'),
+    path('admin/profiles/<str:entry_id>/', admin_views.profile_detail, name='admin_profile_detail'),
+    path('admin/profiles/<str:entry_id>/download/', admin_views.profile_download, name='admin_profile_download'),
+    # Staff exports (streamed CSV / NDJSON)
+    path('admin/exports/leaderboard/', admin_views.export_leaderboard, name='admin_export_leaderboard'),
+    path('admin/exports/missions/', admin_views.export_missions, name='admin_export_missions'),
     path('admin/', admin.site.urls),
+    path('internal/metrics/', metrics_view, name='metrics'),
     path('myapp/', include('myapp.urls')),
     
     # Authentication
     path('accounts/login/', auth_views.LoginView.as_view(), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'),
 ]
+
+# DEBUG=False のときは collectstatic 済みのファイルを長期キャッシュ付きで返す
+# （DEBUG 中は runserver が staticfiles を配信する）
+if not settings.DEBUG:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'),
+            serve_static,
+            name='static',
+        ),
+    ]
@@ -1,12 +1,59 @@
 from django.contrib import admin
-from .models import UserProfile, UserDailyMission
+from .models import UserProfile, UserDailyMission, SearchKeywordStat, Hotel, HotelRankingSnapshot
+from .paginator import EstimatedCountPaginator
+
+
+class UsernameSearchMixin:
+  """
+  ユーザー名の完全一致で検索する（username のユニークインデックスを使う）。
+  デフォルトの icontains 検索はテーブル全体を走査してしまうため。
+  """
+  search_fields = ("user__username",)
+  search_help_text = "ユーザー名（完全一致）"
+
+  def get_search_results(self, request, queryset, search_term):
+    search_term = search_term.strip()
+    if not search_term:
+      return queryset, False
+    return queryset.filter(user__username=search_term), False
+
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(UsernameSearchMixin, admin.ModelAdmin):
   list_display = ("user", "points")
+  list_select_related = ("user",)
+  raw_id_fields = ("user",)
+  paginator = EstimatedCountPaginator
+  show_full_result_count = False
 
 
 @admin.register(UserDailyMission)
-class UserDailyMissionAdmin(admin.ModelAdmin):
+class UserDailyMissionAdmin(UsernameSearchMixin, admin.ModelAdmin):
   list_display = ("user", "date", "mission_type", "completed", "completed_at")
-  list_filter = ("mission_type", "date", "completed")
+  list_filter = ("mission_type", "completed")
+  list_select_related = ("user",)
+  date_hierarchy = "date"
+  raw_id_fields = ("user",)
+  paginator = EstimatedCountPaginator
+  show_full_result_count = False
+
+
+@admin.register(SearchKeywordStat)
+class SearchKeywordStatAdmin(admin.ModelAdmin):
+  list_display = ("endpoint", "keyword", "count", "last_seen")
+  list_filter = ("endpoint",)
+  search_fields = ("keyword",)
+  ordering = ("endpoint", "-count")
+
+
+@admin.register(Hotel)
+class HotelAdmin(admin.ModelAdmin):
+  list_display = ("hotel_no", "name", "middle_class_name")
+  search_fields = ("=hotel_no", "name")
+
+
+@admin.register(HotelRankingSnapshot)
+class HotelRankingSnapshotAdmin(admin.ModelAdmin):
+  list_display = ("genre", "fetched_at", "digest")
+  list_filter = ("genre",)
+  date_hierarchy = "fetched_at"
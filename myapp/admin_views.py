@@ -0,0 +1,147 @@
+# myapp/admin_views.py
+from collections import defaultdict
+
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import profiling
+from .services.exports import (
+    EXPORT_FORMATS,
+    LEADERBOARD_HEADER,
+    MISSION_HEADER,
+    leaderboard_rows,
+    mission_rows,
+    stream_export,
+)
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+
+@staff_member_required
+def profile_list(request):
+    """
+    保存済みのリクエスト計測を、遅い順に一覧表示する管理画面。
+    ?url_name=... で URL 名ごとに絞り込める。
+    """
+    entries = profiling.list_entries()
+
+    # URL 名ごとの集計（件数・最大・平均）
+    grouped = defaultdict(list)
+    for e in entries:
+        grouped[e.get("url_name") or "-"].append(e["duration_ms"])
+    summary = sorted(
+        (
+            {
+                "url_name": name,
+                "count": len(durations),
+                "max_ms": max(durations),
+                "avg_ms": round(sum(durations) / len(durations), 1),
+            }
+            for name, durations in grouped.items()
+        ),
+        key=lambda row: -row["max_ms"],
+    )
+
+    url_name = request.GET.get("url_name")
+    if url_name:
+        entries = [e for e in entries if (e.get("url_name") or "-") == url_name]
+    entries.sort(key=lambda e: -e["duration_ms"])
+
+    context = {
+        **admin.site.each_context(request),
+        "title": "Slow requests",
+        "entries": entries,
+        "summary": summary,
+        "selected_url_name": url_name,
+    }
+    return render(request, "admin/myapp/profile_list.html", context)
+
+
+@staff_member_required
+def profile_detail(request, entry_id):
+    entry = profiling.get_entry(entry_id)
+    if entry is None:
+        raise Http404("計測結果が見つかりません")
+
+    sort = request.GET.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "ncalls"):
+        sort = "cumulative"
+
+    stats_text = None
+    if entry.get("has_profile"):
+        stats_text = profiling.render_stats(entry_id, sort=sort)
+
+    context = {
+        **admin.site.each_context(request),
+        "title": f"{entry['method']} {entry['path']}",
+        "entry": entry,
+        "stats_text": stats_text,
+        "sort": sort,
+    }
+    return render(request, "admin/myapp/profile_detail.html", context)
+
+
+@staff_member_required
+def profile_download(request, entry_id):
+    entry = profiling.get_entry(entry_id)
+    if entry is None or not entry.get("has_profile"):
+        raise Http404("プロファイルがありません")
+    return FileResponse(
+        open(profiling.profile_path(entry_id), "rb"),
+        as_attachment=True,
+        filename=f"{entry_id}.prof",
+        content_type="application/octet-stream",
+    )
+
+
+def _export_response(fmt, name, header, rows):
+    response = StreamingHttpResponse(
+        stream_export(fmt, header, rows),
+        content_type=EXPORT_CONTENT_TYPES[fmt],
+    )
+    stamp = timezone.localdate().isoformat()
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}-{stamp}.{fmt}"'
+    return response
+
+
+@staff_member_required
+def export_leaderboard(request):
+    """
+    ポイントランキング全件をストリーミングで返す。
+    ?format=csv（デフォルト）/ ndjson
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("format は csv か ndjson を指定してください")
+    return _export_response(fmt, "leaderboard", LEADERBOARD_HEADER, leaderboard_rows())
+
+
+@staff_member_required
+def export_missions(request):
+    """
+    ミッション履歴をストリーミングで返す。
+    ?format=csv / ndjson, ?since=YYYY-MM-DD, ?until=YYYY-MM-DD
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("format は csv か ndjson を指定してください")
+
+    dates = {}
+    for key in ("since", "until"):
+        value = request.GET.get(key)
+        if value:
+            try:
+                dates[key] = parse_date(value)
+            except ValueError:
+                dates[key] = None
+            if dates[key] is None:
+                return HttpResponseBadRequest(f"{key} は YYYY-MM-DD 形式で指定してください")
+
+    return _export_response(fmt, "missions", MISSION_HEADER, mission_rows(**dates))
@@ -0,0 +1,23 @@
+# myapp/checks.py
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    本番（DEBUG=False）で LocMem キャッシュのままなら警告する。
+    フラグメントの無効化がワーカー間で共有されず、表示が最大 FRAGMENT_CACHE_TIMEOUT 秒古くなる。
+    """
+    if settings.DEBUG or settings.CACHES["default"]["BACKEND"] != LOCMEM_BACKEND:
+        return []
+    return [
+        Warning(
+            "LocMemCache はワーカーごとのキャッシュのため、ミッション達成時のフラグメント無効化が"
+            "他のワーカーに届きません。",
+            hint="REDIS_URL を設定して共有キャッシュを使ってください。",
+            id="myapp.W001",
+        )
+    ]
@@ -0,0 +1,21 @@
+# myapp/fileutils.py
+import os
+import tempfile
+from pathlib import Path
+
+
+def write_atomic(path: Path, data: bytes | str):
+    """
+    一時ファイルに書いてから置き換える（読み手に書きかけの内容を見せない）。
+    失敗したら一時ファイルを消して例外をそのまま投げる。扱いは呼び出し側で決める。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from myapp.services.exports import (
+    EXPORT_FORMATS,
+    LEADERBOARD_HEADER,
+    MISSION_HEADER,
+    leaderboard_rows,
+    mission_rows,
+    stream_export,
+)
+
+
+def _date(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"日付は YYYY-MM-DD 形式で指定してください: {value}")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "ポイントランキング・ミッション履歴を CSV / NDJSON で書き出す（メモリ使用量は件数によらず一定）。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=("leaderboard", "missions"))
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--output", "-o", help="出力ファイル（省略時は標準出力）")
+        parser.add_argument("--since", type=_date, help="missions のみ: この日以降")
+        parser.add_argument("--until", type=_date, help="missions のみ: この日まで")
+
+    def handle(self, *args, **options):
+        if options["dataset"] == "leaderboard":
+            header, rows = LEADERBOARD_HEADER, leaderboard_rows()
+        else:
+            header = MISSION_HEADER
+            rows = mission_rows(since=options["since"], until=options["until"])
+
+        chunks = stream_export(options["format"], header, rows)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                f.writelines(chunks)
+        else:
+            # call_command(..., stdout=...) で出力先を差し替えられるよう self.stdout に書く
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.models import SearchKeywordStat
+from myapp.services.external_api import books_search, games_search, ichiba_item_search
+from myapp.services.keyword_stats import SEARCH_ENDPOINTS, top_keywords
+
+SEARCH_FUNCTIONS = {
+    "ichiba": ichiba_item_search,
+    "books": books_search,
+    "games": games_search,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "よく検索されるキーワードの検索結果を取り直してキャッシュを更新する。"
+        "SEARCH_CACHE_TIMEOUT より短い間隔で cron などから定期実行する。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=settings.SEARCH_WARM_TOP_N,
+            help="エンドポイントごとに更新するキーワード数",
+        )
+        parser.add_argument(
+            "--endpoint",
+            choices=SEARCH_ENDPOINTS,
+            action="append",
+            help="対象のエンドポイント（省略時はすべて）",
+        )
+        parser.add_argument(
+            "--prune-days",
+            type=int,
+            default=30,
+            help="この日数以上検索されていないキーワードの集計を削除する（0 で削除しない）",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=settings.SEARCH_WARM_WINDOW_DAYS)
+
+        for endpoint in options["endpoint"] or SEARCH_ENDPOINTS:
+            search = SEARCH_FUNCTIONS[endpoint]
+            warmed = failed = 0
+            for keyword in top_keywords(endpoint, options["top"], since=since):
+                _items, error = search(keyword, refresh=True)
+                if error is None:
+                    warmed += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"[{endpoint}] {keyword}: {error}")
+            self.stdout.write(f"[{endpoint}] warmed={warmed} failed={failed}")
+
+        if options["prune_days"] > 0:
+            cutoff = now - timedelta(days=options["prune_days"])
+            deleted, _ = SearchKeywordStat.objects.filter(last_seen__lt=cutoff).delete()
+            self.stdout.write(f"pruned {deleted} stale keywords")
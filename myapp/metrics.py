@@ -0,0 +1,359 @@
+# myapp/metrics.py
+"""
+プロセス内のメトリクス（カウンタ・ヒストグラム）と Prometheus テキスト形式での出力。
+
+各ワーカープロセスは自分の値を METRICS_DIR/<pid>-<ランダム>.json に定期的に書き出し、
+/internal/metrics/ は全プロセス分のファイルを合算して返す。
+終了したプロセスのファイルは archive.json に足し込んでから削除する
+（カウンタが減らないように）。
+
+書き出すのは MetricsMiddleware を読み込んだプロセス（Web サーバーのワーカー）だけで、
+manage.py のコマンドなどはファイルを作らない。
+"""
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .fileutils import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# 楽天 API の呼び出し時間（秒）のバケット
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ビューの処理時間（秒）のバケット
+VIEW_DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# method ラベルに使う HTTP メソッド（それ以外は "other" にまとめ、系列数を抑える）
+KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+# 終了したプロセスの値を足し込むファイルと、その更新中に作るロック用ディレクトリ
+ARCHIVE_FILE = "archive.json"
+ARCHIVE_LOCK = "archive.lock"
+# ロックがこの秒数より古ければ、更新中に落ちたものとみなして消す
+ARCHIVE_LOCK_TIMEOUT = 60
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self.registry.label_key(self, labels)
+        with self.registry.lock:
+            values = self.registry.values[self.name]
+            values[key] = values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.registry.label_key(self, labels)
+        with self.registry.lock:
+            values = self.registry.values[self.name]
+            # [各バケットの件数..., 合計, 件数]（バケットは累積ではなく区間ごと）
+            state = values.get(key)
+            if state is None:
+                state = values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+        self.registry.maybe_flush()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}
+        self.lock = threading.Lock()
+        self._last_flush = 0.0
+        # MetricsMiddleware が読み込まれたプロセスだけ True（ファイルに書き出す）
+        self.serving = False
+        self._pid = None
+        self._process_id = None
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(self, name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        self.values[metric.name] = {}
+        return metric
+
+    @staticmethod
+    def label_key(metric, labels):
+        # JSON に書き出すため、ラベル値のタプルではなく文字列をキーにする
+        return json.dumps([str(labels.get(name, "")) for name in metric.labelnames])
+
+    # ---------- プロセス間の共有 ----------
+    def process_id(self) -> str:
+        """
+        このプロセスのファイル名。pid が再利用されても別のファイルになるよう乱数を付ける。
+        fork 後の子プロセスでは作り直し、親から引き継いだ値も捨てる。
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            with self.lock:
+                if self._pid is not None:
+                    for values in self.values.values():
+                        values.clear()
+                self._pid = pid
+                self._process_id = f"{pid}-{uuid.uuid4().hex[:8]}"
+        return self._process_id
+
+    def maybe_flush(self):
+        if not (settings.METRICS_ENABLED and self.serving):
+            return
+        if time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        このプロセスの値をファイルに書き出す。
+        書けなくてもリクエストは止めない（ログに残し、次の間隔で書き直す）。
+        """
+        process_id = self.process_id()
+        with self.lock:
+            data = json.dumps(self.values)
+            self._last_flush = time.monotonic()
+        try:
+            write_atomic(Path(settings.METRICS_DIR) / f"{process_id}.json", data)
+        except OSError:
+            logger.exception("メトリクスを書き出せませんでした (%s)", settings.METRICS_DIR)
+
+    def collect(self):
+        """全プロセスのファイルを読み、メトリクスごとに合算した値を返す。"""
+        self.flush()
+        directory = Path(settings.METRICS_DIR)
+        _archive_dead_processes(directory)
+
+        merged = {name: {} for name in self.metrics}
+        for path in directory.glob("*.json"):
+            data = _read_json(path)
+            if data is not None:
+                _merge_into(merged, data, self.metrics)
+        return merged
+
+    # ---------- Prometheus テキスト形式 ----------
+    def exposition(self) -> str:
+        merged = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged[name].items()):
+                labels = list(zip(metric.labelnames, json.loads(key)))
+                if metric.kind == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value):
+                    cumulative += count
+                    le = labels + [("le", _format_value(bound))]
+                    lines.append(f"{name}_bucket{_format_labels(le)} {cumulative}")
+                le = labels + [("le", "+Inf")]
+                lines.append(f"{name}_bucket{_format_labels(le)} {value[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _read_json(path: Path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_into(merged: dict, data: dict, names=None):
+    """data の値を merged に足し込む。names を指定したらそのメトリクスだけ。"""
+    for name, series in data.items():
+        if names is None:
+            target = merged.setdefault(name, {})
+        elif name in names:
+            target = merged[name]
+        else:
+            continue
+        for key, value in series.items():
+            if isinstance(value, list):
+                current = target.get(key)
+                target[key] = (
+                    list(value) if current is None
+                    else [a + b for a, b in zip(current, value)]
+                )
+            else:
+                target[key] = target.get(key, 0) + value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _archive_dead_processes(directory: Path):
+    """
+    終了したプロセスのファイルを archive.json に足し込んで削除する。
+    ロック（ディレクトリ作成）を取れなかったら、今回は何もしない。
+    Windows では os.kill(pid, 0) がプロセスを終了させてしまうので行わない。
+    """
+    if os.name != "posix":
+        return
+    dead = []
+    for path in directory.glob("*-*.json"):
+        try:
+            pid = int(path.stem.split("-", 1)[0])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            dead.append(path)
+    if not dead:
+        return
+
+    lock = directory / ARCHIVE_LOCK
+    try:
+        if time.time() - lock.stat().st_mtime > ARCHIVE_LOCK_TIMEOUT:
+            shutil.rmtree(lock, ignore_errors=True)
+    except FileNotFoundError:
+        pass
+    try:
+        lock.mkdir()
+    except FileExistsError:
+        return
+    try:
+        archive = _read_json(directory / ARCHIVE_FILE) or {}
+        for path in dead:
+            data = _read_json(path)
+            if data is not None:
+                _merge_into(archive, data)
+        try:
+            write_atomic(directory / ARCHIVE_FILE, json.dumps(archive))
+        except OSError:
+            # 足し込めなかったファイルは消さずに残し、次回やり直す
+            logger.exception("終了したプロセスのメトリクスを archive に保存できませんでした")
+            return
+        for path in dead:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    finally:
+        shutil.rmtree(lock, ignore_errors=True)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+@atexit.register
+def _flush_on_exit():
+    if settings.METRICS_ENABLED and registry.serving:
+        registry.flush()
+
+
+# =========================
+# メトリクス定義
+# =========================
+rakuten_request_seconds = registry.histogram(
+    "myapp_rakuten_request_seconds",
+    "Latency of Rakuten API calls.",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+rakuten_errors_total = registry.counter(
+    "myapp_rakuten_errors_total",
+    "Failed Rakuten API calls by kind (timeout / http / connection / parse / circuit_open / other).",
+    ["endpoint", "kind"],
+)
+search_cache_total = registry.counter(
+    "myapp_search_cache_requests_total",
+    "Search result cache lookups by result (hit / miss).",
+    ["endpoint", "result"],
+)
+mission_completions_total = registry.counter(
+    "myapp_mission_completions_total",
+    "Daily missions newly completed.",
+    ["mission_type"],
+)
+mission_clicks_total = registry.counter(
+    "myapp_mission_clicks_total",
+    "Mission link clicks by result (processed / already_done / throttled).",
+    ["mission_type", "result"],
+)
+view_duration_seconds = registry.histogram(
+    "myapp_view_duration_seconds",
+    "Request duration per view.",
+    ["view", "method"],
+    buckets=VIEW_DURATION_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """ビュー（URL 名）ごとの処理時間を記録する。"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Web サーバーのプロセスとして、値をファイルに書き出すようにする
+        registry.serving = True
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        # メソッド名はクライアントが自由に送れるので、既知のもの以外はまとめる
+        method = request.method if request.method in KNOWN_METHODS else "other"
+        view_duration_seconds.observe(
+            time.perf_counter() - start,
+            view=match.view_name if match else "unmatched",
+            method=method,
+        )
+        return response
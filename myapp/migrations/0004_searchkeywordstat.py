@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_alter_userdailymission_mission_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchKeywordStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(choices=[('ichiba', '楽天市場'), ('books', '楽天ブックス'), ('games', '楽天ゲームズ')], max_length=20)),
+                ('keyword', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['endpoint', '-count'], name='keywordstat_endpoint_count')],
+                'unique_together': {('endpoint', 'keyword')},
+            },
+        ),
+    ]
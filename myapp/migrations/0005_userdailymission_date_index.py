@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_searchkeywordstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userdailymission',
+            index=models.Index(fields=['-date', 'user', 'mission_type'], name='dailymission_date_user_type'),
+        ),
+    ]
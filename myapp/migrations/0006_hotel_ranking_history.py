@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_userdailymission_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hotel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hotel_no', models.PositiveIntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('middle_class_name', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HotelRankingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=20)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('digest', models.CharField(max_length=12)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['genre', '-fetched_at'], name='hotelsnapshot_genre_fetched')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HotelRankingEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('review_average', models.FloatField(blank=True, null=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranking_entries', to='myapp.hotel')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='myapp.hotelrankingsnapshot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hotel', 'snapshot'], name='hotelentry_hotel_snapshot')],
+                'unique_together': {('snapshot', 'hotel')},
+            },
+        ),
+    ]
@@ -68,6 +68,10 @@ class UserDailyMission(models.Model):
     class Meta:
         unique_together = ("user", "date", "mission_type")
         ordering = ["-date", "user_id", "mission_type"]
+        indexes = [
+            # 管理画面の並び順・日付階層（date_hierarchy）での絞り込み用
+            models.Index(fields=["-date", "user", "mission_type"], name="dailymission_date_user_type"),
+        ]
 
     def mark_completed(self, when: timezone.datetime | None = None):
         """ミッション達成フラグを立てるヘルパー。"""
@@ -77,4 +81,90 @@ class UserDailyMission(models.Model):
             self.save(update_fields=["completed", "completed_at"])
 
     def __str__(self):
-        return f"{self.user.username} {self.date} {self.mission_type} completed={self.completed}"
\ No newline at end of file
+        return f"{self.user.username} {self.date} {self.mission_type} completed={self.completed}"
+
+
+# =========================
+# 検索キーワードの集計（キャッシュ事前ウォーム用）
+# =========================
+SEARCH_ENDPOINT_CHOICES = [
+    ("ichiba", "楽天市場"),
+    ("books", "楽天ブックス"),
+    ("games", "楽天ゲームズ"),
+]
+
+
+class SearchKeywordStat(models.Model):
+    """
+    エンドポイントごとの検索キーワードの回数。
+    プロセス内の頻出キーワード集計（services/keyword_stats.py）から定期的に加算される。
+    """
+    endpoint = models.CharField(max_length=20, choices=SEARCH_ENDPOINT_CHOICES)
+    keyword = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("endpoint", "keyword")
+        indexes = [
+            models.Index(fields=["endpoint", "-count"], name="keywordstat_endpoint_count"),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.keyword} ({self.count})"
+
+# =========================
+# ホテルランキングの履歴
+# =========================
+class Hotel(models.Model):
+    """ランキングに登場したホテル（名前などはスナップショットごとに持たずここにまとめる）。"""
+    hotel_no = models.PositiveIntegerField(unique=True)  # 楽天トラベルの施設番号
+    name = models.CharField(max_length=255)
+    middle_class_name = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return f"{self.hotel_no} {self.name}"
+
+
+class HotelRankingSnapshot(models.Model):
+    """
+    ジャンルごとに取得したランキング 1 回分。
+    前回と内容が同じ（digest が一致する）ときは保存しない。
+    """
+    genre = models.CharField(max_length=20)  # "all" / "onsen" / "premium"
+    fetched_at = models.DateTimeField(default=timezone.now)
+    digest = models.CharField(max_length=12)  # ホテル・順位・評価から作るハッシュ
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["genre", "-fetched_at"], name="hotelsnapshot_genre_fetched"),
+        ]
+
+    def __str__(self):
+        return f"{self.genre} {self.fetched_at:%Y-%m-%d %H:%M}"
+
+
+class HotelRankingEntry(models.Model):
+    """スナップショット内の 1 行（ホテル・順位・評価だけを持つ）。"""
+    snapshot = models.ForeignKey(
+        HotelRankingSnapshot,
+        on_delete=models.CASCADE,
+        related_name="entries",
+    )
+    hotel = models.ForeignKey(
+        Hotel,
+        on_delete=models.CASCADE,
+        related_name="ranking_entries",
+    )
+    rank = models.PositiveSmallIntegerField()
+    review_average = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("snapshot", "hotel")
+        indexes = [
+            # ホテルごとの順位推移用
+            models.Index(fields=["hotel", "snapshot"], name="hotelentry_hotel_snapshot"),
+        ]
+
+    def __str__(self):
+        return f"{self.snapshot} #{self.rank} {self.hotel_id}"
@@ -0,0 +1,54 @@
+# myapp/paginator.py
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    大きなテーブル向けに COUNT(*) を避けるページネータ（管理画面用）。
+
+    ・絞り込みなし: DB の統計情報（PostgreSQL / MySQL）か最大 ID から件数を推定する
+    ・絞り込みあり: count_limit 件までしか数えない
+    どちらもテーブルの大きさに関係なくほぼ一定時間で返る。
+    """
+
+    # 推定値がこれより小さいとき・絞り込み時に数える上限
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            estimate = self._estimate(qs)
+            if estimate is not None and estimate >= self.count_limit:
+                return estimate
+        # 並び順は件数に関係ないので、サブクエリから ORDER BY を外す
+        return qs.order_by()[: self.count_limit].count()
+
+    @staticmethod
+    def _estimate(qs):
+        connection = connections[qs.db]
+        table = qs.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [table],
+                )
+                row = cursor.fetchone()
+                # 一度も ANALYZE されていないテーブルは -1 になる
+                if row and row[0] >= 0:
+                    return int(row[0])
+                return None
+            if connection.vendor == "mysql":
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [table],
+                )
+                row = cursor.fetchone()
+                return int(row[0]) if row and row[0] is not None else None
+        # その他（SQLite など）: 主キーのインデックスから最大 ID を取る
+        return qs.model._default_manager.using(qs.db).aggregate(n=Max("pk"))["n"]
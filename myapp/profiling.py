@@ -0,0 +1,165 @@
+# myapp/profiling.py
+"""
+リクエスト単位のプロファイラ。
+
+・スタッフが ?_profile=1 を付けたリクエストは cProfile で計測して保存
+・スタッフのリクエストは PROFILER_SAMPLE_RATE の割合で cProfile で計測して保存
+・PROFILER_SLOW_THRESHOLD_MS を超えたリクエストは所要時間を記録する
+  （プロファイラのオーバーヘッドが乗るので、計測したリクエストは遅い判定に使わない）
+保存先は PROFILER_DIR で、PROFILER_MAX_ENTRIES 件を超えると古いものから削除する。
+結果は管理画面（/admin/profiles/）から確認できる。
+"""
+import cProfile
+import io
+import json
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_QUERY_FLAG = "_profile"
+
+# save_entry が作る ID の形式（ファイル名に使うので、これ以外は受け付けない）
+ENTRY_ID_RE = re.compile(r"\d+-[0-9a-f]{8}")
+
+
+# =========================
+# 保存先（ディスク）
+# =========================
+def _store_dir() -> Path:
+    return Path(settings.PROFILER_DIR)
+
+
+def _entry_paths(entry_id: str):
+    base = _store_dir() / entry_id
+    return base.with_suffix(".json"), base.with_suffix(".prof")
+
+
+def save_entry(meta: dict, profiler: cProfile.Profile | None = None) -> str:
+    store = _store_dir()
+    store.mkdir(parents=True, exist_ok=True)
+
+    # ファイル名の先頭を時刻にして、名前順 = 古い順にする
+    entry_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    meta_path, prof_path = _entry_paths(entry_id)
+    meta = dict(meta, id=entry_id, has_profile=profiler is not None)
+
+    if profiler is not None:
+        profiler.dump_stats(prof_path)
+    meta_path.write_text(json.dumps(meta))
+
+    _prune(store)
+    return entry_id
+
+
+def _prune(store: Path):
+    entries = sorted(store.glob("*.json"))
+    excess = len(entries) - settings.PROFILER_MAX_ENTRIES
+    for meta_path in entries[:max(excess, 0)]:
+        for path in (meta_path, meta_path.with_suffix(".prof")):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_entries() -> list[dict]:
+    entries = []
+    store = _store_dir()
+    if not store.exists():
+        return entries
+    for meta_path in store.glob("*.json"):
+        try:
+            entries.append(json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def get_entry(entry_id: str) -> dict | None:
+    if not ENTRY_ID_RE.fullmatch(entry_id):
+        return None
+    meta_path, _prof_path = _entry_paths(entry_id)
+    try:
+        return json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def profile_path(entry_id: str) -> Path:
+    return _entry_paths(entry_id)[1]
+
+
+def render_stats(entry_id: str, sort: str = "cumulative", limit: int = 60) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(str(profile_path(entry_id)), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+# =========================
+# ミドルウェア
+# =========================
+class RequestProfilerMiddleware:
+    """
+    PROFILER_ENABLED=False のときはミドルウェア自体を外すので、オーバーヘッドはない。
+    有効時も、計測対象でないリクエストは時刻を 2 回取るだけ。
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold_ms = settings.PROFILER_SLOW_THRESHOLD_MS
+        self.sample_rate = settings.PROFILER_SAMPLE_RATE
+
+    def __call__(self, request):
+        trigger = None
+        if PROFILE_QUERY_FLAG in request.GET and request.user.is_staff:
+            trigger = "flag"
+        elif self.sample_rate and random.random() < self.sample_rate and request.user.is_staff:
+            trigger = "sample"
+
+        start = time.perf_counter()
+        profiler = None
+        if trigger:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 別スレッドで既にプロファイラが動いている
+                profiler = None
+
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        if profiler is not None:
+            save_entry(self._meta(request, response, duration_ms, trigger), profiler)
+        elif self.threshold_ms is not None and duration_ms >= self.threshold_ms:
+            save_entry(self._meta(request, response, duration_ms, "slow"))
+        return response
+
+    @staticmethod
+    def _meta(request, response, duration_ms, trigger):
+        match = request.resolver_match
+        user = getattr(request, "user", None)
+        return {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "url_name": match.view_name if match else "",
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 1),
+            "trigger": trigger,
+            "user": user.get_username() if user is not None and user.is_authenticated else "",
+        }
@@ -0,0 +1,129 @@
+# myapp/services/autocomplete.py
+"""
+検索フォームの入力補完用の、プロセス内の前方一致インデックス。
+
+過去の検索キーワードと、検索結果に出てきた商品名・タイトルを
+エンドポイントごとにソート済みリストで持ち、bisect で前方一致検索する。
+楽天 API は呼ばない。
+"""
+import bisect
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from .keyword_stats import SEARCH_ENDPOINTS, top_keywords
+
+# 補完候補として表示する最大文字数（商品名は長いので切る）
+MAX_SUGGESTION_LENGTH = 60
+
+# 1 回の検索で前方一致を調べる最大件数（短い接頭辞でも時間を一定にする）
+MAX_SCAN = 200
+
+# 検索キーワードは商品名より優先して出す
+KEYWORD_WEIGHT = 5
+TITLE_WEIGHT = 1
+
+
+def normalize(text: str) -> str:
+    """全角・半角や大文字・小文字の違いを吸収する。"""
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
+class PrefixIndex:
+    """
+    ソート済みの正規化文字列リスト + 重み付きの表示文字列。
+    件数が capacity の 1.25 倍を超えたら、重みの小さいもの（同じ重みなら古いもの）から
+    capacity 件まで削り、残した重みを半分にする。古い候補の重みが減っていくので、
+    新しく追加された候補もいずれ残るようになる。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._keys: list[str] = []
+        # 正規化文字列 -> [重み, 表示文字列, 最後に追加された順番]
+        self._entries: dict[str, list] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def add(self, text: str, weight: int = 1):
+        text = text.strip()[:MAX_SUGGESTION_LENGTH]
+        key = normalize(text)
+        if not key:
+            return
+        with self._lock:
+            self._seq += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0] += weight
+                entry[2] = self._seq
+                return
+            self._entries[key] = [weight, text, self._seq]
+            bisect.insort(self._keys, key)
+            if len(self._keys) > self.capacity * 5 // 4:
+                self._compact()
+
+    def _compact(self):
+        entries = self._entries
+        keep = sorted(entries, key=lambda k: (-entries[k][0], -entries[k][2]))[: self.capacity]
+        for k in keep:
+            entries[k][0] = max(entries[k][0] // 2, 1)
+        self._entries = {k: entries[k] for k in keep}
+        self._keys = sorted(keep)
+
+    def suggest(self, prefix: str, limit: int = 8) -> list[str]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._keys, prefix)
+            candidates = []
+            for key in self._keys[start:start + MAX_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                candidates.append(self._entries[key])
+        candidates.sort(key=lambda entry: (-entry[0], -entry[2]))
+        return [text for _weight, text, _seq in candidates[:limit]]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class Autocomplete:
+    """エンドポイントごとの PrefixIndex。初回利用時に DB の頻出キーワードで初期化する。"""
+
+    def __init__(self, capacity: int):
+        self._indexes = {ep: PrefixIndex(capacity) for ep in SEARCH_ENDPOINTS}
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def _index(self, endpoint: str) -> PrefixIndex | None:
+        index = self._indexes.get(endpoint)
+        if index is None or endpoint in self._loaded:
+            return index
+        with self._lock:
+            if endpoint not in self._loaded:
+                self._loaded.add(endpoint)
+                keywords = top_keywords(endpoint, index.capacity // 2)
+                # 回数の多い順に並んでいるので、上位ほど重みを大きくする
+                for rank, keyword in enumerate(keywords):
+                    index.add(keyword, KEYWORD_WEIGHT + len(keywords) - rank)
+        return index
+
+    def add_keyword(self, endpoint: str, keyword: str):
+        index = self._index(endpoint)
+        if index is not None:
+            index.add(keyword, KEYWORD_WEIGHT)
+
+    def add_titles(self, endpoint: str, titles):
+        index = self._index(endpoint)
+        if index is not None:
+            for title in titles:
+                index.add(title, TITLE_WEIGHT)
+
+    def suggest(self, endpoint: str, prefix: str, limit: int = 8) -> list[str]:
+        index = self._index(endpoint)
+        return index.suggest(prefix, limit) if index is not None else []
+
+
+autocomplete = Autocomplete(capacity=settings.AUTOCOMPLETE_CAPACITY)
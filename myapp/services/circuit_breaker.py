@@ -0,0 +1,64 @@
+# myapp/services/circuit_breaker.py
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    エンドポイントごとのサーキットブレーカー（プロセス内）。
+
+    closed    : 通常どおり呼び出す。連続で failure_threshold 回失敗したら open へ
+    open      : reset_timeout 秒の間は呼び出さずに即失敗させる
+    half_open : reset_timeout 経過後、1 リクエストだけ試しに通す。
+                成功すれば closed、失敗すれば再び open。
+                試しのリクエストの結果が reset_timeout 経っても記録されなければ
+                もう 1 リクエスト通す（half_open のまま止まらないように）
+
+    リクエスト側の誤り（4xx）は record_neutral で記録し、連続失敗回数を変えない。
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_timeout:
+                # 試しの 1 リクエストを通す（結果が出るまで他は即失敗）
+                self.state = HALF_OPEN
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_neutral(self):
+        """
+        成功とも失敗とも数えない結果。連続失敗回数はそのまま。
+        half_open の試しのリクエストなら API は応答しているので closed に戻す。
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
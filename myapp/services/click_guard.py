@@ -0,0 +1,76 @@
+# myapp/services/click_guard.py
+"""
+/go/rakuten/ のクリック処理の前段に置く、キャッシュだけで判定できるチェック。
+
+・今日すでに達成済みと分かっているミッションのクリックは、DB を見ずに済ませる
+・ユーザーごとのスライディングウィンドウでクリック回数を制限する
+
+どちらも Django のキャッシュ（Redis 設定時は全ワーカーで共有）だけを使う。
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+def _mission_done_key(user_id, date, mission_type) -> str:
+    return f"mission_done:{user_id}:{date.isoformat()}:{mission_type}"
+
+
+def _seconds_until_tomorrow() -> int:
+    now = timezone.localtime()
+    tomorrow = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time.min, tzinfo=now.tzinfo
+    )
+    return max(int((tomorrow - now).total_seconds()), 1)
+
+
+def is_mission_done(user_id, date, mission_type) -> bool:
+    return cache.get(_mission_done_key(user_id, date, mission_type)) is not None
+
+
+def mark_mission_done(user_id, date, mission_type):
+    """達成済みを記録する。キーに日付を含むので、日付が変わるまで保持すれば十分。"""
+    cache.set(_mission_done_key(user_id, date, mission_type), 1, _seconds_until_tomorrow())
+
+
+class SlidingWindowRateLimiter:
+    """
+    スライディングウィンドウ・カウンタ方式のレート制限。
+
+    window 秒ごとの固定ウィンドウで回数を数え、直前のウィンドウの回数を
+    経過割合で按分して足したものを「直近 window 秒の回数」とみなす。
+    キャッシュの add / incr / get だけで済むので、共有キャッシュでもロック不要。
+    """
+
+    def __init__(self, prefix: str, limit: int, window: int):
+        self.prefix = prefix
+        self.limit = limit
+        self.window = window
+
+    def hit(self, ident) -> bool:
+        """1 回分を数え、制限内なら True を返す。"""
+        now = time.time()
+        current = int(now // self.window)
+        key = f"{self.prefix}:{ident}:{current}"
+
+        cache.add(key, 0, timeout=self.window * 2)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # add と incr の間に期限切れになった
+            cache.set(key, 1, timeout=self.window * 2)
+            count = 1
+
+        previous = cache.get(f"{self.prefix}:{ident}:{current - 1}", 0)
+        elapsed = (now % self.window) / self.window
+        return previous * (1 - elapsed) + count <= self.limit
+
+
+click_rate_limiter = SlidingWindowRateLimiter(
+    "mission_click_rate",
+    limit=settings.MISSION_CLICK_RATE_LIMIT,
+    window=settings.MISSION_CLICK_RATE_WINDOW,
+)
@@ -0,0 +1,84 @@
+# myapp/services/exports.py
+"""
+ポイントランキング・ミッション履歴のエクスポート（CSV / NDJSON）。
+
+行はジェネレータで 1 行ずつ返し、DB からは iterator(chunk_size=...) で少しずつ読むので、
+件数が増えてもメモリ使用量は一定。
+"""
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from myapp.models import UserDailyMission
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# DB から一度に読む行数
+EXPORT_CHUNK_SIZE = 2000
+
+LEADERBOARD_HEADER = ("rank", "user_id", "username", "points")
+MISSION_HEADER = ("user_id", "username", "date", "mission_type", "completed", "completed_at")
+
+
+def leaderboard_rows():
+    """
+    ポイント降順・同点ならユーザー ID 昇順（RankingView と同じ順位）。
+    プロフィールが無いユーザーは 0 ポイントとして扱う。
+    """
+    users = (
+        get_user_model().objects
+        .annotate(total_points=Coalesce("profile__points", Value(0)))
+        .order_by("-total_points", "id")
+        .values_list("id", "username", "total_points")
+    )
+    for rank, (user_id, username, points) in enumerate(
+        users.iterator(chunk_size=EXPORT_CHUNK_SIZE), start=1
+    ):
+        yield rank, user_id, username, points
+
+
+def mission_rows(since=None, until=None):
+    """ミッション履歴を日付の古い順に返す。since / until は両端を含む。"""
+    qs = UserDailyMission.objects.all()
+    if since:
+        qs = qs.filter(date__gte=since)
+    if until:
+        qs = qs.filter(date__lte=until)
+    qs = qs.order_by("date", "user_id", "mission_type").values_list(
+        "user_id", "user__username", "date", "mission_type", "completed", "completed_at",
+    )
+    yield from qs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Echo:
+    """csv.writer の出力先。書き込まれた文字列をそのまま返す。"""
+
+    def write(self, value):
+        return value
+
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_isoformat(v) for v in row])
+
+
+def stream_ndjson(header, rows):
+    for row in rows:
+        yield json.dumps(
+            dict(zip(header, (_isoformat(v) for v in row))), ensure_ascii=False
+        ) + "\n"
+
+
+def stream_export(fmt, header, rows):
+    if fmt == "ndjson":
+        return stream_ndjson(header, rows)
+    return stream_csv(header, rows)
@@ -1,17 +1,165 @@
 # myapp/services/external_api.py
+import hashlib
+import time
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
+
+from myapp.metrics import rakuten_errors_total, rakuten_request_seconds, search_cache_total
+
+from .autocomplete import autocomplete
+from .circuit_breaker import CircuitBreaker
+from .hotel_history import record_snapshot
+from .keyword_stats import normalize_keyword, record_keyword
+from .records import HotelRecord, ItemRecord
 
 ICHIBA_URL = "https://app.rakuten.co.jp/services/api/IchibaItem/Search/20220601"
 BOOKS_URL = "https://app.rakuten.co.jp/services/api/BooksBook/Search/20170404"
 GAMES_URL = "https://app.rakuten.co.jp/services/api/BooksGame/Search/20170404"
 HOTEL_RANKING_URL = "https://app.rakuten.co.jp/services/api/Travel/HotelRanking/20170426"
 
+# エンドポイントごとのサーキットブレーカー
+BREAKERS = {
+    endpoint: CircuitBreaker(
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+    )
+    for endpoint in ("ichiba", "books", "games", "hotel")
+}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """ブレーカーが open のため、API を呼ばずに失敗させたときの例外。"""
+
+
+def _is_server_failure(error: requests.exceptions.HTTPError) -> bool:
+    # 4xx（キーワード不正など）は楽天側の障害ではないのでブレーカーを開かない
+    status = error.response.status_code if error.response is not None else 500
+    return status >= 500 or status == 429
+
+
+def _rakuten_get(endpoint: str, url: str, params: dict):
+    """
+    楽天 API を呼び出し、所要時間とエラー種別をメトリクスに記録する。
+    ブレーカーが open のときは呼び出さずに CircuitOpenError を投げる。
+    例外はそのまま呼び出し元に投げる。
+    """
+    breaker = BREAKERS[endpoint]
+    if not breaker.allow():
+        rakuten_errors_total.inc(endpoint=endpoint, kind="circuit_open")
+        raise CircuitOpenError("楽天APIが一時的に利用できません。しばらくしてから再度お試しください。")
+
+    start = time.perf_counter()
+    try:
+        resp = requests.get(url, params=params, timeout=5)
+        resp.raise_for_status()
+        data = resp.json()
+    except requests.exceptions.Timeout:
+        rakuten_errors_total.inc(endpoint=endpoint, kind="timeout")
+        breaker.record_failure()
+        raise
+    except requests.exceptions.HTTPError as e:
+        rakuten_errors_total.inc(endpoint=endpoint, kind="http")
+        if _is_server_failure(e):
+            breaker.record_failure()
+        else:
+            # 4xx はリクエスト側の問題。連続失敗回数をリセットも加算もしない
+            breaker.record_neutral()
+        raise
+    except ValueError:
+        # requests の JSONDecodeError も ValueError のサブクラス
+        rakuten_errors_total.inc(endpoint=endpoint, kind="parse")
+        breaker.record_failure()
+        raise
+    except requests.exceptions.RequestException:
+        rakuten_errors_total.inc(endpoint=endpoint, kind="connection")
+        breaker.record_failure()
+        raise
+    except Exception:
+        # 想定外の例外でも必ず結果を記録する（half_open のまま残さない）
+        rakuten_errors_total.inc(endpoint=endpoint, kind="other")
+        breaker.record_failure()
+        raise
+    finally:
+        rakuten_request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+
+    breaker.record_success()
+    return data
+
+
+def search_cache_key(endpoint: str, keyword: str, *extra) -> str:
+    digest = hashlib.md5(keyword.encode(), usedforsecurity=False).hexdigest()
+    parts = ":".join(str(e) for e in extra)
+    return f"search:{endpoint}:{parts}:{digest}"
+
+
+def _cached_search(endpoint: str, keyword: str | None, key: str, fetch, refresh: bool):
+    """
+    検索結果をキャッシュ経由で返す。
+    ・ユーザーからの検索（refresh=False）はキーワードを集計し、キャッシュがあればそれを返す
+    ・refresh=True（事前ウォーム）は必ず API を呼び、キャッシュを更新する
+    ・ユーザーからの検索が失敗したときは、最後に成功した結果（stale）があればそれを返す
+      （refresh=True では失敗をそのまま返し、ウォームの失敗が分かるようにする）
+    ・失敗は短時間（SEARCH_NEGATIVE_CACHE_TIMEOUT）キャッシュし、同じ検索で API を待たせない
+    """
+    stale_key = f"{key}:stale"
+    negative_key = f"{key}:error"
+
+    if not refresh:
+        if keyword:
+            record_keyword(endpoint, keyword)
+        items = cache.get(key)
+        if items is not None:
+            search_cache_total.inc(endpoint=endpoint, result="hit")
+            if keyword and items:
+                autocomplete.add_keyword(endpoint, keyword)
+            return items, None
+        search_cache_total.inc(endpoint=endpoint, result="miss")
+
+        error = cache.get(negative_key)
+        if error is not None:
+            return _stale_or_error(stale_key, error)
+
+    items, error = fetch()
+    if error is None:
+        cache.set(key, items, settings.SEARCH_CACHE_TIMEOUT)
+        cache.set(stale_key, items, settings.SEARCH_STALE_CACHE_TIMEOUT)
+        # 入力補完：結果が出たキーワードと、結果の商品名を候補に加える
+        if keyword and items:
+            if not refresh:
+                autocomplete.add_keyword(endpoint, keyword)
+            autocomplete.add_titles(endpoint, [item.itemName for item in items])
+        return items, None
+
+    cache.set(negative_key, error, settings.SEARCH_NEGATIVE_CACHE_TIMEOUT)
+    if refresh:
+        return [], error
+    return _stale_or_error(stale_key, error)
 
-def ichiba_item_search(keyword: str, hits: int = 5):
+
+def _stale_or_error(stale_key: str, error: str):
+    items = cache.get(stale_key)
+    if items is not None:
+        return items, None
+    return [], error
+
+
+def ichiba_item_search(keyword: str, hits: int = 5, refresh: bool = False):
+    keyword = normalize_keyword(keyword)
     if not keyword:
         return [], "検索キーワードを入力してください。"
 
+    return _cached_search(
+        "ichiba",
+        keyword,
+        search_cache_key("ichiba", keyword, hits),
+        lambda: _fetch_ichiba_items(keyword, hits),
+        refresh,
+    )
+
+
+def _fetch_ichiba_items(keyword: str, hits: int):
     params = {
         "applicationId": settings.RAKUTEN_APP_ID,
         "keyword": keyword,
@@ -20,10 +168,8 @@ def ichiba_item_search(keyword: str, hits: int = 5):
     }
 
     try:
-        resp = requests.get(ICHIBA_URL, params=params, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        items = [item["Item"] for item in data.get("Items", [])]
+        data = _rakuten_get("ichiba", ICHIBA_URL, params)
+        items = [ItemRecord.from_ichiba(item["Item"]) for item in data.get("Items", [])]
         return items, None
     except requests.exceptions.RequestException as e:
         return [], f"APIリクエストエラー: {e}"
@@ -31,10 +177,21 @@ def ichiba_item_search(keyword: str, hits: int = 5):
         return [], f"データの処理中にエラーが発生しました: {e}"
 
 
-def books_search(keyword: str, hits: int = 5, sort: str | None = None):
+def books_search(keyword: str, hits: int = 5, sort: str | None = None, refresh: bool = False):
+    keyword = normalize_keyword(keyword)
     if not keyword:
         return [], "検索キーワードを入力してください。"
 
+    return _cached_search(
+        "books",
+        keyword,
+        search_cache_key("books", keyword, hits, sort or ""),
+        lambda: _fetch_books(keyword, hits, sort),
+        refresh,
+    )
+
+
+def _fetch_books(keyword: str, hits: int, sort: str | None):
     params = {
         "applicationId": settings.RAKUTEN_APP_ID,
         "title": keyword,
@@ -45,20 +202,29 @@ def books_search(keyword: str, hits: int = 5, sort: str | None = None):
         params["sort"] = sort
 
     try:
-        resp = requests.get(BOOKS_URL, params=params, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        items = [item["Item"] for item in data.get("Items", [])]
+        data = _rakuten_get("books", BOOKS_URL, params)
+        items = [ItemRecord.from_books(item["Item"]) for item in data.get("Items", [])]
         return items, None
     except requests.exceptions.RequestException as e:
         return [], f"APIリクエストエラー: {e}"
     except Exception as e:
         return [], f"データの処理中にエラーが発生しました: {e}"
 
-def games_search(keyword: str, hits: int = 5):
+def games_search(keyword: str, hits: int = 5, refresh: bool = False):
+    keyword = normalize_keyword(keyword)
     if not keyword:
         return [], "検索キーワードを入力してください。"
 
+    return _cached_search(
+        "games",
+        keyword,
+        search_cache_key("games", keyword, hits),
+        lambda: _fetch_games(keyword, hits),
+        refresh,
+    )
+
+
+def _fetch_games(keyword: str, hits: int):
     params = {
         "applicationId": settings.RAKUTEN_APP_ID,
         "title": keyword,      # ← このAPIは title 検索
@@ -67,23 +233,12 @@ def games_search(keyword: str, hits: int = 5):
     }
 
     try:
-        resp = requests.get(GAMES_URL, params=params, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-
-        raw_items = [item["Item"] for item in data.get("Items", [])]
+        data = _rakuten_get("games", GAMES_URL, params)
 
-        # 👇 Ichiba と同じインターフェースに揃える
-        normalized_items = []
-        for it in raw_items:
-            normalized_items.append({
-                # itemName がなければ title を使う
-                "itemName": it.get("itemName") or it.get("title") or "",
-                "itemUrl": it.get("itemUrl", ""),
-                "itemPrice": it.get("itemPrice") or it.get("itemPriceTaxIncl") or "",
-            })
+        # 👇 Ichiba と同じ ItemRecord に揃える（itemName がなければ title を使う）
+        items = [ItemRecord.from_books(item["Item"]) for item in data.get("Items", [])]
 
-        return normalized_items, None
+        return items, None
 
     except requests.exceptions.RequestException as e:
         return [], f"APIリクエストエラー: {e}"
@@ -91,7 +246,17 @@ def games_search(keyword: str, hits: int = 5):
         return [], f"データの処理中にエラーが発生しました: {e}"
 
 
-def hotel_ranking(genre: str = "all"):
+def hotel_ranking(genre: str = "all", refresh: bool = False):
+    return _cached_search(
+        "hotel",
+        None,
+        search_cache_key("hotel", "", genre),
+        lambda: _fetch_hotel_ranking(genre),
+        refresh,
+    )
+
+
+def _fetch_hotel_ranking(genre: str):
     params = {
         "applicationId": settings.RAKUTEN_APP_ID,
         "format": "json",
@@ -101,9 +266,7 @@ def hotel_ranking(genre: str = "all"):
     }
 
     try:
-        resp = requests.get(HOTEL_RANKING_URL, params=params, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
+        data = _rakuten_get("hotel", HOTEL_RANKING_URL, params)
 
         rankings = data.get("Rankings", [])
         if not rankings:
@@ -115,25 +278,11 @@ def hotel_ranking(genre: str = "all"):
 
         hotels_raw = ranking_obj.get("hotels", [])
 
-        items = []
-        for h in hotels_raw:
-            # v1形式だと {"hotel": {...}} でラップされている可能性があるのでケア
-            hotel = h.get("hotel", h)
-
-            items.append({
-                "rank": hotel.get("rank"),
-                "hotelName": hotel.get("hotelName"),
-                "middleClassName": hotel.get("middleClassName"),
-                "userReview": hotel.get("userReview"),
-                "reviewCount": hotel.get("reviewCount"),
-                "reviewAverage": hotel.get("reviewAverage"),
-                "hotelInformationUrl": hotel.get("hotelInformationUrl"),
-                "planListUrl": hotel.get("planListUrl"),
-                "checkAvailableUrl": hotel.get("checkAvailableUrl"),
-                "reviewUrl": hotel.get("reviewUrl"),
-                "hotelImageUrl": hotel.get("hotelImageUrl"),
-                "hotelThumbnailUrl": hotel.get("hotelThumbnailUrl"),
-            })
+        # v1形式だと {"hotel": {...}} でラップされている可能性があるのでケア
+        items = [HotelRecord.from_ranking(h.get("hotel", h)) for h in hotels_raw]
+
+        # 順位推移を出せるよう、取得したランキングを履歴として残す
+        record_snapshot(genre, items)
 
         # デバッグ用: ちゃんと入ってるか確認したかったらこれを見る
         # print(items)
@@ -0,0 +1,40 @@
+# myapp/services/fragment_cache.py
+import hashlib
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+# ユーザー × 日付 でキャッシュしているミッション関連フラグメント名
+# （テンプレートの {% cache %} タグで使っている名前と一致させること）
+MISSION_FRAGMENTS = (
+    "dashboard_missions",   # dashboard.html のタスク表
+    "dashboard_score",      # dashboard.html のポイント・ランク表示
+    "api_test_missions",    # api_test.html のポイント・ミッション状況
+)
+
+# ジャンル × スナップショット でキャッシュしているホテルランキング一覧
+HOTEL_RANKING_FRAGMENT = "hotel_ranking_list"
+
+
+def invalidate_mission_fragments(user_id, date):
+    """
+    ミッション達成時に、そのユーザー・その日のミッション関連フラグメントを破棄する。
+    """
+    keys = [
+        make_template_fragment_key(name, [user_id, date])
+        for name in MISSION_FRAGMENTS
+    ]
+    cache.delete_many(keys)
+
+
+def ranking_snapshot(items) -> str:
+    """
+    ランキング内容から短いスナップショット ID を作る。
+    HotelRecord の全項目（画像・リンク・地域も含む）から作るので、
+    一覧に表示する内容が変われば必ずキーが変わり、古い一覧が表示され続けることはない。
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    for hotel in items:
+        digest.update(repr(hotel.__reduce__()[1]).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()[:12]
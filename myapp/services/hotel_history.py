@@ -0,0 +1,151 @@
+# myapp/services/hotel_history.py
+"""
+ホテルランキングの履歴（スナップショット）の保存と、順位推移の取得。
+
+ホテル名などは Hotel に 1 件ずつまとめ、スナップショットには
+（ホテル, 順位, 評価）だけを保存する。前回と同じ内容なら保存しない。
+"""
+import datetime
+import hashlib
+import logging
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from myapp.models import Hotel, HotelRankingEntry, HotelRankingSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def _review_average(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ranking_rows(items) -> dict:
+    """hotelNo -> (順位, 評価, HotelRecord)。番号・順位が無い行は捨てる。"""
+    rows = {}
+    for hotel in items:
+        try:
+            hotel_no, rank = int(hotel.hotelNo), int(hotel.rank)
+        except (TypeError, ValueError):
+            continue
+        rows.setdefault(hotel_no, (rank, _review_average(hotel.reviewAverage), hotel))
+    return rows
+
+
+def _digest(rows) -> str:
+    digest = hashlib.md5(usedforsecurity=False)
+    for hotel_no, (rank, review_average, _hotel) in sorted(rows.items()):
+        digest.update(f"{hotel_no}|{rank}|{review_average}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def record_snapshot(genre: str, items):
+    """
+    取得したランキングをスナップショットとして保存する。
+    履歴の保存に失敗してもランキング表示は続けたいので、DB エラーはログに残して続行する。
+    """
+    rows = _ranking_rows(items)
+    if not rows:
+        return
+    digest = _digest(rows)
+
+    try:
+        with transaction.atomic():
+            latest = (
+                HotelRankingSnapshot.objects
+                .filter(genre=genre)
+                .order_by("-fetched_at")
+                .values_list("digest", flat=True)
+                .first()
+            )
+            if latest == digest:
+                return
+
+            Hotel.objects.bulk_create(
+                [
+                    Hotel(
+                        hotel_no=hotel_no,
+                        name=(hotel.hotelName or "")[:255],
+                        middle_class_name=(hotel.middleClassName or "")[:100],
+                    )
+                    for hotel_no, (_rank, _review, hotel) in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["hotel_no"],
+                update_fields=["name", "middle_class_name"],
+            )
+            hotel_ids = dict(
+                Hotel.objects.filter(hotel_no__in=rows).values_list("hotel_no", "id")
+            )
+
+            snapshot = HotelRankingSnapshot.objects.create(genre=genre, digest=digest)
+            HotelRankingEntry.objects.bulk_create(
+                HotelRankingEntry(
+                    snapshot=snapshot,
+                    hotel_id=hotel_ids[hotel_no],
+                    rank=rank,
+                    review_average=review_average,
+                )
+                for hotel_no, (rank, review_average, _hotel) in rows.items()
+            )
+    except DatabaseError:
+        logger.exception("ホテルランキングの履歴を保存できませんでした (genre=%s)", genre)
+
+
+def _start_of_today():
+    return timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+
+
+def previous_ranks(genre: str, before=None):
+    """
+    before（デフォルトは今日の 0 時）より前の最後のスナップショットの順位。
+    (スナップショット ID, {hotelNo: 順位}) を返す。無ければ (None, {})。
+    """
+    before = before or _start_of_today()
+    snapshot_id = (
+        HotelRankingSnapshot.objects
+        .filter(genre=genre, fetched_at__lt=before)
+        .order_by("-fetched_at")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if snapshot_id is None:
+        return None, {}
+    ranks = dict(
+        HotelRankingEntry.objects
+        .filter(snapshot_id=snapshot_id)
+        .values_list("hotel__hotel_no", "rank")
+    )
+    return snapshot_id, ranks
+
+
+def rank_changes(genre: str, items):
+    """
+    items と同じ並びで、昨日からの順位の変化を返す（上がれば正の数）。
+    昨日のランキングに無かったホテルは None。
+    """
+    baseline_id, ranks = previous_ranks(genre)
+    changes = []
+    for hotel in items:
+        previous = ranks.get(hotel.hotelNo)
+        changes.append(previous - hotel.rank if previous is not None and hotel.rank else None)
+    return baseline_id, changes
+
+
+def rank_history(hotel_no: int, genre: str = "all", days: int = 30):
+    """ホテルの順位推移を古い順に [(取得日時, 順位, 評価), ...] で返す。"""
+    since = timezone.now() - datetime.timedelta(days=days)
+    return list(
+        HotelRankingEntry.objects
+        .filter(
+            hotel__hotel_no=hotel_no,
+            snapshot__genre=genre,
+            snapshot__fetched_at__gte=since,
+        )
+        .order_by("snapshot__fetched_at")
+        .values_list("snapshot__fetched_at", "rank", "review_average")
+    )
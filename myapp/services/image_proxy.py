@@ -0,0 +1,210 @@
+# myapp/services/image_proxy.py
+import hashlib
+import os
+import threading
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from PIL import Image, UnidentifiedImageError
+
+from myapp.fileutils import write_atomic
+
+# 表示サイズ（80px のサムネイル）とその 2x / 4x
+IMAGE_PROXY_WIDTHS = (80, 160, 320)
+
+# 取得元として許可するホスト（楽天の画像 CDN のみ。オープンプロキシにしない）
+ALLOWED_HOST_SUFFIXES = (".rakuten.co.jp", ".r10s.jp")
+
+# 取得する画像の最大サイズ（バイト）
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+
+# デコードする画像の最大ピクセル数（RGBA で約 16MB）。
+# 小さいファイルでも巨大な画像に展開されるもの（圧縮爆弾）を読み込まない
+MAX_SOURCE_PIXELS = 2048 * 2048
+
+# たどるリダイレクトの最大回数（各リダイレクト先も is_allowed_url で確認する）
+MAX_REDIRECTS = 3
+
+# 追い出し時は上限のこの割合まで減らす（毎回の追い出しを避ける）
+CACHE_LOW_WATER_RATIO = 0.9
+
+
+class ImageProxyError(Exception):
+    """画像の取得・変換に失敗したときの例外。"""
+
+
+def is_allowed_url(url: str) -> bool:
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    return parts.scheme in ("http", "https") and any(
+        host == suffix[1:] or host.endswith(suffix) for suffix in ALLOWED_HOST_SUFFIXES
+    )
+
+
+def fetch_remote_image(url: str) -> bytes:
+    """
+    楽天 CDN から画像を取得する（デフォルトの取得関数）。
+    テストでは settings.IMAGE_PROXY_FETCHER に別の関数を指定して差し替える。
+
+    リダイレクトは自動でたどらず、行き先が許可されたホストかを 1 回ずつ確認する
+    （楽天ドメインのリダイレクタ経由で内部ネットワークなどを取得させないため）。
+    """
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = requests.get(url, timeout=5, stream=True, allow_redirects=False)
+            if not resp.is_redirect:
+                break
+            resp.close()
+            url = urljoin(url, resp.headers["Location"])
+            if not is_allowed_url(url):
+                raise ImageProxyError("許可されていないリダイレクト先です")
+        else:
+            raise ImageProxyError("リダイレクトが多すぎます")
+        resp.raise_for_status()
+        data = resp.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+    except requests.exceptions.RequestException as e:
+        raise ImageProxyError(f"画像の取得に失敗しました: {e}") from e
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ImageProxyError("画像が大きすぎます")
+    return data
+
+
+def _fetcher():
+    return import_string(
+        getattr(settings, "IMAGE_PROXY_FETCHER", "myapp.services.image_proxy.fetch_remote_image")
+    )
+
+
+def _cache_dir() -> Path:
+    return Path(settings.IMAGE_PROXY_CACHE_DIR)
+
+
+def cache_key(url: str, width: int) -> str:
+    return hashlib.sha256(f"{width}:{url}".encode()).hexdigest()
+
+
+def _path_for(key: str) -> Path:
+    # 1 ディレクトリにファイルが集中しないよう先頭 2 文字で分ける
+    return _cache_dir() / key[:2] / f"{key}.webp"
+
+
+def _resize_all(data: bytes) -> dict[int, bytes]:
+    """1 回の取得結果から、表示に使う全サイズの WebP を作る。"""
+    try:
+        image = Image.open(BytesIO(data))
+        # JPEG は最大幅に近い縮小率でデコードさせる（他の形式では何もしない）
+        max_width = max(IMAGE_PROXY_WIDTHS)
+        if image.width > max_width:
+            image.draft("RGB", (max_width, max(1, image.height * max_width // image.width)))
+        # ヘッダーの寸法だけで判定し、展開する前に断る
+        if image.width * image.height > MAX_SOURCE_PIXELS:
+            raise ImageProxyError("画像の解像度が大きすぎます")
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ImageProxyError(f"画像を読み込めませんでした: {e}") from e
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    variants = {}
+    for width in IMAGE_PROXY_WIDTHS:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        else:
+            resized = image
+        buf = BytesIO()
+        resized.save(buf, format="WEBP", quality=80)
+        variants[width] = buf.getvalue()
+    return variants
+
+
+# このプロセスから見たキャッシュ全体のサイズ（初回書き込み時に 1 回だけ走査して求める）
+_cache_total = None
+_cache_total_lock = threading.Lock()
+
+
+def _track_written(nbytes: int):
+    """
+    書き込んだバイト数を加算し、上限を超えたときだけ追い出しを行う。
+    毎回ディレクトリ全体を走査しないためのもの。他のワーカーの書き込みは
+    次の追い出し時の走査で反映されるので、一時的に上限を少し超えることはある。
+    """
+    global _cache_total
+    with _cache_total_lock:
+        if _cache_total is None:
+            _cache_total = _scan_cache()[1]
+        _cache_total += nbytes
+        over = _cache_total > settings.IMAGE_PROXY_CACHE_MAX_BYTES
+    if over:
+        evict_lru()
+
+
+def _scan_cache():
+    entries = []
+    total = 0
+    for path in _cache_dir().glob("*/*.webp"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    return entries, total
+
+
+def evict_lru(max_bytes: int | None = None):
+    """
+    キャッシュ全体が上限を超えていたら、最終アクセス（mtime）が古い順に
+    上限の CACHE_LOW_WATER_RATIO 倍まで削除する。
+    """
+    global _cache_total
+    if max_bytes is None:
+        max_bytes = settings.IMAGE_PROXY_CACHE_MAX_BYTES
+
+    entries, total = _scan_cache()
+    if total > max_bytes:
+        low_water = max_bytes * CACHE_LOW_WATER_RATIO
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= low_water:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    with _cache_total_lock:
+        _cache_total = total
+
+
+def get_image(url: str, width: int) -> tuple[bytes, str]:
+    """
+    プロキシ用の WebP 画像と ETag 用キーを返す。
+    キャッシュに無ければ一度だけ取得し、全サイズをまとめて保存する。
+    """
+    if width not in IMAGE_PROXY_WIDTHS:
+        raise ImageProxyError("対応していない幅です")
+    if not is_allowed_url(url):
+        raise ImageProxyError("許可されていない画像 URL です")
+
+    key = cache_key(url, width)
+    path = _path_for(key)
+    try:
+        data = path.read_bytes()
+        # LRU 用にアクセス時刻を更新
+        os.utime(path)
+        return data, key
+    except FileNotFoundError:
+        pass  # 未取得、または追い出し済み → 取り直す
+
+    variants = _resize_all(_fetcher()(url))
+    for w, data in variants.items():
+        write_atomic(_path_for(cache_key(url, w)), data)
+    _track_written(sum(len(data) for data in variants.values()))
+    return variants[width], key
@@ -0,0 +1,163 @@
+# myapp/services/keyword_stats.py
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from myapp.models import SearchKeywordStat
+
+# 集計対象の検索エンドポイント
+SEARCH_ENDPOINTS = ("ichiba", "books", "games")
+
+# これより長いキーワードは集計しない（ほぼ一度きりの検索のため）
+MAX_TRACKED_KEYWORD_LENGTH = 100
+
+# DB への反映で、1 回の IN 句に入れるキーワード数
+FLUSH_BATCH_SIZE = 500
+
+
+def normalize_keyword(keyword: str) -> str:
+    """
+    前後の空白を除き、連続する空白（全角スペースを含む）を 1 つにまとめる。
+    キャッシュキー・集計・API 呼び出しのすべてでこの結果を使う。
+    """
+    return " ".join(keyword.split())
+
+
+class SpaceSavingCounter:
+    """
+    Space-Saving アルゴリズムによる頻出キーワードの近似カウンタ。
+    保持するキーワード数は capacity 個までで、メモリ使用量は一定。
+    あふれたときは最小カウントのキーワードを置き換え、そのカウント + 1 を引き継ぐ
+    （カウントは過大評価になりうるが、本当に多いキーワードは必ず残る）。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+
+    def add(self, key: str, n: int = 1):
+        if key in self.counts:
+            self.counts[key] += n
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = n
+        else:
+            victim = min(self.counts, key=self.counts.__getitem__)
+            self.counts[key] = self.counts.pop(victim) + n
+
+    def clear(self):
+        self.counts.clear()
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class KeywordTracker:
+    """
+    プロセス内でエンドポイントごとのキーワード頻度を集計し、
+    一定間隔で DB（SearchKeywordStat）に加算して空にする。
+    DB への反映はバックグラウンドのスレッドで行い、検索リクエストを待たせない。
+    """
+
+    def __init__(self, capacity: int, flush_interval: float):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self._counters = {ep: SpaceSavingCounter(capacity) for ep in SEARCH_ENDPOINTS}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flushing = False
+
+    def record(self, endpoint: str, keyword: str):
+        """keyword は normalize_keyword() 済みのものを渡す。"""
+        if not keyword or len(keyword) > MAX_TRACKED_KEYWORD_LENGTH:
+            return
+        with self._lock:
+            counter = self._counters.get(endpoint)
+            if counter is None:
+                return
+            counter.add(keyword)
+            due = (
+                not self._flushing
+                and time.monotonic() - self._last_flush >= self.flush_interval
+            )
+            if due:
+                self._flushing = True
+        if due:
+            threading.Thread(target=self._flush_in_background, daemon=True).start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flushing = False
+            # このスレッド用に開いた DB 接続を閉じる
+            connection.close()
+
+    def flush(self):
+        """集計中のカウントを取り出して DB に加算する。"""
+        with self._lock:
+            pending = {
+                ep: list(counter.counts.items())
+                for ep, counter in self._counters.items()
+                if counter
+            }
+            for counter in self._counters.values():
+                counter.clear()
+            self._last_flush = time.monotonic()
+
+        # 集計は近似で良いので、DB エラーで失敗しても捨てるだけにする
+        try:
+            for endpoint, counts in pending.items():
+                _add_counts(endpoint, counts)
+        except DatabaseError:
+            pass
+
+
+def _add_counts(endpoint: str, counts):
+    """
+    まとめて加算する。未登録のキーワードを count=0 で一括作成してから、
+    同じ加算値のキーワードごとに 1 回の UPDATE で F() 加算する
+    （ほとんどのキーワードは 1 回なので、UPDATE は数回で済む）。
+    """
+    now = timezone.now()
+    by_amount = defaultdict(list)
+    for keyword, n in counts:
+        by_amount[n].append(keyword)
+
+    with transaction.atomic():
+        SearchKeywordStat.objects.bulk_create(
+            [
+                SearchKeywordStat(endpoint=endpoint, keyword=keyword, count=0, last_seen=now)
+                for keyword, _n in counts
+            ],
+            ignore_conflicts=True,
+            batch_size=FLUSH_BATCH_SIZE,
+        )
+        for n, keywords in by_amount.items():
+            for i in range(0, len(keywords), FLUSH_BATCH_SIZE):
+                SearchKeywordStat.objects.filter(
+                    endpoint=endpoint, keyword__in=keywords[i:i + FLUSH_BATCH_SIZE]
+                ).update(count=F("count") + n, last_seen=now)
+
+
+tracker = KeywordTracker(
+    capacity=settings.KEYWORD_TRACKER_CAPACITY,
+    flush_interval=settings.KEYWORD_TRACKER_FLUSH_INTERVAL,
+)
+
+
+def record_keyword(endpoint: str, keyword: str):
+    tracker.record(endpoint, keyword)
+
+
+def top_keywords(endpoint: str, n: int, since=None):
+    """最近検索された中で回数の多いキーワードを返す。"""
+    qs = SearchKeywordStat.objects.filter(endpoint=endpoint)
+    if since is not None:
+        qs = qs.filter(last_seen__gte=since)
+    return list(qs.order_by("-count").values_list("keyword", flat=True)[:n])
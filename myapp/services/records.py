@@ -0,0 +1,106 @@
+# myapp/services/records.py
+"""
+楽天 API の検索結果を表す軽量なレコード。
+
+API のレスポンス（ネストした dict）をそのまま持ち回すと、表示に使わない項目まで
+メモリ・キャッシュに載ってしまうため、必要な項目だけを __slots__ に持つ
+イミュータブルなオブジェクトに 1 回で変換する。
+属性名はテンプレートとの互換のため API のキー名（camelCase）に合わせている。
+"""
+
+
+class _Record:
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        values = dict(zip(self.__slots__, args))
+        values.update(kwargs)
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        # キャッシュ（pickle）には値のタプルだけを保存する
+        return (type(self), tuple(getattr(self, name) for name in self.__slots__))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.__reduce__()[1] == other.__reduce__()[1]
+
+    def __hash__(self):
+        return hash(self.__reduce__()[1])
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+def _first_image_url(images):
+    """mediumImageUrls は [{"imageUrl": ...}] か ["..."] のどちらかで返る。"""
+    if not images:
+        return ""
+    first = images[0]
+    if isinstance(first, dict):
+        return first.get("imageUrl", "")
+    return first
+
+
+class ItemRecord(_Record):
+    """市場・ブックス・ゲームズ共通の商品レコード。"""
+
+    __slots__ = ("itemName", "itemUrl", "itemPrice", "shopName", "imageUrl")
+
+    @classmethod
+    def from_ichiba(cls, raw: dict) -> "ItemRecord":
+        return cls(
+            raw.get("itemName", ""),
+            raw.get("itemUrl", ""),
+            raw.get("itemPrice", ""),
+            raw.get("shopName", ""),
+            _first_image_url(raw.get("mediumImageUrls")),
+        )
+
+    @classmethod
+    def from_books(cls, raw: dict) -> "ItemRecord":
+        # ブックス・ゲームズは itemName ではなく title で返る
+        return cls(
+            raw.get("itemName") or raw.get("title") or "",
+            raw.get("itemUrl", ""),
+            raw.get("itemPrice") or raw.get("itemPriceTaxIncl") or "",
+            "",
+            raw.get("mediumImageUrl") or raw.get("largeImageUrl") or "",
+        )
+
+
+class HotelRecord(_Record):
+    """ホテルランキングの 1 件。"""
+
+    __slots__ = (
+        "rank",
+        "hotelNo",
+        "hotelName",
+        "middleClassName",
+        "reviewCount",
+        "reviewAverage",
+        "hotelInformationUrl",
+        "hotelThumbnailUrl",
+    )
+
+    @classmethod
+    def from_ranking(cls, raw: dict) -> "HotelRecord":
+        return cls(
+            raw.get("rank"),
+            raw.get("hotelNo"),
+            raw.get("hotelName"),
+            raw.get("middleClassName"),
+            raw.get("reviewCount"),
+            raw.get("reviewAverage"),
+            raw.get("hotelInformationUrl"),
+            raw.get("hotelThumbnailUrl"),
+        )
@@ -0,0 +1,90 @@
+# myapp/static_serve.py
+import mimetypes
+import os
+import posixpath
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# ハッシュ付きファイルは内容が変われば名前も変わるので 1 年キャッシュさせる
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# ハッシュなしの名前で要求されたときは短めにする
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+
+# Accept-Encoding に応じて優先的に返す事前圧縮ファイル
+PRECOMPRESSED_SUFFIXES = (
+    ("br", ".br"),
+    ("gzip", ".gz"),
+)
+
+
+@cache
+def _hashed_names():
+    return frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+
+def _accepted_encodings(request):
+    header = request.headers.get("Accept-Encoding", "")
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def _set_cache_headers(response, name, mtime):
+    """200 と 304 の両方に同じキャッシュ関連ヘッダを付ける。"""
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Last-Modified"] = http_date(mtime)
+    if name in _hashed_names():
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = DEFAULT_CACHE_CONTROL
+    return response
+
+
+def serve_static(request, path):
+    """
+    collectstatic 済みの STATIC_ROOT からファイルを返すビュー（DEBUG=False 用）。
+    ・.br / .gz の事前圧縮版があれば Accept-Encoding に合わせてそちらを返す
+    ・ハッシュ付きファイル名には immutable な長期キャッシュヘッダを付ける
+    """
+    name = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404("不正なパスです")
+    if not os.path.isfile(fullpath):
+        raise Http404("ファイルが見つかりません")
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(
+        request.headers.get("If-Modified-Since"), stat.st_mtime
+    ):
+        return _set_cache_headers(HttpResponseNotModified(), name, stat.st_mtime)
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+
+    accepted = _accepted_encodings(request)
+    chosen, encoding = fullpath, None
+    for enc, suffix in PRECOMPRESSED_SUFFIXES:
+        if enc in accepted and os.path.isfile(fullpath + suffix):
+            chosen, encoding = fullpath + suffix, enc
+            break
+
+    response = FileResponse(
+        open(chosen, "rb"),
+        content_type=content_type or "application/octet-stream",
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return _set_cache_headers(response, name, stat.st_mtime)
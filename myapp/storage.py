@@ -0,0 +1,102 @@
+# myapp/storage.py
+import gzip
+import posixpath
+import re
+from io import BytesIO
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:  # requirements.txt に含めているが、無い環境では .gz だけ作る
+    brotli = None
+
+# 事前圧縮（.gz / .br）を作る拡張子
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".txt", ".html", ".json", ".map")
+
+# WebP / リサイズ版を作る画像の拡張子
+RESIZABLE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# 生成する WebP の横幅（px）。表示サイズ 80 / 150 / 300px の 2x まで
+IMAGE_VARIANT_WIDTHS = (160, 320, 640)
+
+# 例: img/hotel.w320.webp
+VARIANT_RE = re.compile(r"^(?P<stem>.+)\.w(?P<width>\d+)\.webp$")
+
+
+def image_variant_name(name: str, width: int) -> str:
+    """img/hotel.jpg → img/hotel.w320.webp"""
+    stem, _ext = posixpath.splitext(name)
+    return f"{stem}.w{width}.webp"
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic 時に以下を行う静的ファイルストレージ。
+    ・ファイル名にハッシュを付与し、manifest に記録（ManifestStaticFilesStorage）
+    ・画像から横幅ごとの WebP を生成し、manifest に追加
+    ・CSS / JS などの .gz / .br 圧縮版を並べて保存
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in list(self.hashed_files):
+            if name.lower().endswith(RESIZABLE_EXTENSIONS):
+                for variant, hashed in self._make_image_variants(name):
+                    self.hashed_files[variant] = hashed
+                    yield variant, hashed, True
+
+        for hashed in set(self.hashed_files.values()):
+            if hashed.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                self._precompress(hashed)
+
+        # 追加した WebP を manifest に反映する
+        self.save_manifest()
+
+    def _make_image_variants(self, name):
+        with self.open(self.hashed_files[name]) as f:
+            image = Image.open(f)
+            image.load()
+
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        # 元画像より大きい幅は作らず、代わりに元の幅で 1 枚作る
+        widths = sorted({min(w, image.width) for w in IMAGE_VARIANT_WIDTHS})
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize(
+                (width, height), Image.LANCZOS
+            )
+            buf = BytesIO()
+            resized.save(buf, format="WEBP", quality=80, method=6)
+
+            variant = image_variant_name(name, width)
+            content = ContentFile(buf.getvalue())
+            hashed = self.hashed_name(variant, content)
+            if self.exists(hashed):
+                self.delete(hashed)
+            self._save(hashed, content)
+            yield variant, hashed
+
+    def _precompress(self, hashed):
+        with self.open(hashed) as f:
+            data = f.read()
+
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data)))
+
+        for suffix, compressed in variants:
+            # 圧縮しても小さくならないものは置かない
+            if len(compressed) >= len(data):
+                continue
+            target = hashed + suffix
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(compressed))
@@ -0,0 +1,115 @@
+import calendar
+import datetime
+
+from django import template
+from django.db.models import Max, Min
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+def _date_range(start: datetime.date, end: datetime.date, step):
+    current = start
+    while current <= end:
+        yield current
+        current = step(current)
+
+
+def _next_month(day: datetime.date) -> datetime.date:
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+@register.inclusion_tag("admin/date_hierarchy.html")
+def indexed_date_hierarchy(cl):
+    """
+    admin の date_hierarchy と同じ表示を、MIN / MAX の集計 1 回だけで作る（DateField 用）。
+
+    標準のタグは SELECT DISTINCT で年・月・日の一覧を作るため、絞り込みが無いと
+    テーブル全体を走査する。ここでは最初と最後の日付の間の年・月・日をすべてリンクにする
+    （データの無い月・日のリンクも出る）。
+    """
+    field_name = cl.date_hierarchy
+    year_field = f"{field_name}__year"
+    month_field = f"{field_name}__month"
+    day_field = f"{field_name}__day"
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f"{field_name}__"])
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            "show": True,
+            "back": {
+                "link": link({year_field: year_lookup, month_field: month_lookup}),
+                "title": capfirst(formats.date_format(day, "YEAR_MONTH_FORMAT")),
+            },
+            "choices": [{"title": capfirst(formats.date_format(day, "MONTH_DAY_FORMAT"))}],
+        }
+
+    # cl.queryset は年・月の指定があればその範囲に絞り込み済み（インデックスの範囲検索になる）
+    bounds = cl.queryset.aggregate(first=Min(field_name), last=Max(field_name))
+    first, last = bounds["first"], bounds["last"]
+    if first is None:
+        return {"show": False}
+
+    if not (year_lookup or month_lookup):
+        # 標準のタグと同じく、範囲が 1 年・1 か月に収まるならその階層から表示する
+        if first.year == last.year:
+            year_lookup = first.year
+            if first.month == last.month:
+                month_lookup = first.month
+
+    if year_lookup and month_lookup:
+        year, month = int(year_lookup), int(month_lookup)
+        month_start = datetime.date(year, month, 1)
+        month_end = month_start.replace(day=calendar.monthrange(year, month)[1])
+        days = _date_range(
+            max(first, month_start),
+            min(last, month_end),
+            lambda d: d + datetime.timedelta(days=1),
+        )
+        return {
+            "show": True,
+            "back": {"link": link({year_field: year_lookup}), "title": str(year_lookup)},
+            "choices": [
+                {
+                    "link": link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                    "title": capfirst(formats.date_format(day, "MONTH_DAY_FORMAT")),
+                }
+                for day in days
+            ],
+        }
+
+    if year_lookup:
+        year = int(year_lookup)
+        months = _date_range(
+            max(first, datetime.date(year, 1, 1)).replace(day=1),
+            min(last, datetime.date(year, 12, 31)),
+            _next_month,
+        )
+        return {
+            "show": True,
+            "back": {"link": link({}), "title": _("All dates")},
+            "choices": [
+                {
+                    "link": link({year_field: year_lookup, month_field: month.month}),
+                    "title": capfirst(formats.date_format(month, "YEAR_MONTH_FORMAT")),
+                }
+                for month in months
+            ],
+        }
+
+    return {
+        "show": True,
+        "back": None,
+        "choices": [
+            {"link": link({year_field: str(year)}), "title": str(year)}
+            for year in range(first.year, last.year + 1)
+        ],
+    }
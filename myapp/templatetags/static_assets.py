@@ -0,0 +1,55 @@
+import posixpath
+from functools import cache
+
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from myapp.storage import VARIANT_RE
+
+register = template.Library()
+
+
+@cache
+def _variant_index():
+    """
+    manifest から { "img/hotel": [(160, "img/hotel.w160.webp"), ...] } を作る。
+    manifest は起動時に一度だけ読まれるので、索引もプロセスごとに一度で良い。
+    """
+    index = {}
+    for name in getattr(staticfiles_storage, "hashed_files", {}):
+        m = VARIANT_RE.match(name)
+        if m:
+            index.setdefault(m["stem"], []).append((int(m["width"]), name))
+    for variants in index.values():
+        variants.sort()
+    return index
+
+
+@register.filter
+def proxied_image(url, width):
+    """
+    外部画像 URL を画像プロキシ経由の URL に変換する。
+
+    使い方:
+      <img src="{{ hotel.hotelThumbnailUrl|proxied_image:80 }}">
+    """
+    if not url:
+        return ""
+    return f"{reverse('myapp:image_proxy')}?{urlencode({'url': url, 'w': width})}"
+
+
+@register.simple_tag
+def webp_srcset(path):
+    """
+    collectstatic で生成した WebP の srcset を返す。
+    生成物が無い（開発環境など）ときは空文字なので、<source> を出さずに済む。
+
+    使い方:
+      {% webp_srcset 'img/hotel.jpg' as hotel_srcset %}
+    """
+    stem, _ext = posixpath.splitext(path)
+    variants = _variant_index().get(stem, [])
+    return ", ".join(f"{static(name)} {width}w" for width, name in variants)
@@ -1,3 +1,904 @@
-from django.test import TestCase
+import datetime
+import json
+import pickle
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from . import checks, metrics, profiling, static_serve
+from .models import (
+    Hotel,
+    HotelRankingEntry,
+    HotelRankingSnapshot,
+    SearchKeywordStat,
+    UserDailyMission,
+    UserProfile,
+)
+from .paginator import EstimatedCountPaginator
+from .services import click_guard, external_api, image_proxy
+from .services import hotel_history
+from .services.autocomplete import Autocomplete, PrefixIndex
+from .services.fragment_cache import ranking_snapshot
+from .services.keyword_stats import KeywordTracker
+from .services.records import HotelRecord, ItemRecord, _first_image_url
+from .services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .storage import PrecompressedManifestStaticFilesStorage
+
+
+def _png(width, height):
+    buf = BytesIO()
+    Image.new("RGB", (width, height), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# IMAGE_PROXY_FETCHER に指定するスタブ（呼ばれた URL を記録する）
+fetched_urls = []
+
+
+def stub_fetch_image(url):
+    fetched_urls.append(url)
+    return _png(400, 300)
+
+
+IMAGE_URL = "https://img.travel.rakuten.co.jp/image/sample.jpg"
+
+
+@override_settings(IMAGE_PROXY_FETCHER="myapp.tests.stub_fetch_image")
+class ImageProxyTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(IMAGE_PROXY_CACHE_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        fetched_urls.clear()
+        image_proxy._cache_total = None
+        self.client.force_login(User.objects.create_user("alice"))
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get("/myapp/img/", {"url": IMAGE_URL, "w": 80})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(fetched_urls, [])
+
+    def test_resizes_and_caches(self):
+        response = self.client.get("/myapp/img/", {"url": IMAGE_URL, "w": 80})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(Image.open(BytesIO(response.content)).width, 80)
+
+        # 他の幅もまとめて保存されているので、取得し直さない
+        response = self.client.get("/myapp/img/", {"url": IMAGE_URL, "w": 160})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(fetched_urls, [IMAGE_URL])
+
+    def test_evicts_when_over_limit(self):
+        with override_settings(IMAGE_PROXY_CACHE_MAX_BYTES=1):
+            self.client.get("/myapp/img/", {"url": IMAGE_URL, "w": 80})
+            self.client.get("/myapp/img/", {"url": IMAGE_URL + "?2", "w": 80})
+        self.assertEqual(image_proxy._scan_cache()[1], 0)
+        self.assertEqual(image_proxy._cache_total, 0)
+
+    def test_disallowed_host(self):
+        response = self.client.get("/myapp/img/", {"url": "http://169.254.169.254/x.png", "w": 80})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(fetched_urls, [])
+
+    def test_rejects_huge_image(self):
+        with self.assertRaises(image_proxy.ImageProxyError):
+            image_proxy._resize_all(_png(5000, 5000))
+
+
+class FetchRemoteImageTests(TestCase):
+    def _response(self, status, location=None):
+        resp = mock.Mock(status_code=status, headers={}, is_redirect=location is not None)
+        if location:
+            resp.headers["Location"] = location
+        return resp
+
+    @mock.patch("myapp.services.image_proxy.requests.get")
+    def test_does_not_follow_redirect_to_other_host(self, get):
+        get.return_value = self._response(302, "http://169.254.169.254/latest/meta-data/")
+        with self.assertRaises(image_proxy.ImageProxyError):
+            image_proxy.fetch_remote_image("https://hb.afl.rakuten.co.jp/hgc/abc")
+        self.assertEqual(get.call_count, 1)
+        self.assertFalse(get.call_args.kwargs["allow_redirects"])
+
+    @mock.patch("myapp.services.image_proxy.requests.get")
+    def test_follows_redirect_within_allowed_hosts(self, get):
+        final = self._response(200)
+        final.raw.read.return_value = b"image"
+        get.side_effect = [
+            self._response(302, "https://thumbnail.image.rakuten.co.jp/a.jpg"),
+            final,
+        ]
+        self.assertEqual(image_proxy.fetch_remote_image("https://hb.afl.rakuten.co.jp/x"), b"image")
+        self.assertEqual(get.call_args.args[0], "https://thumbnail.image.rakuten.co.jp/a.jpg")
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("myapp.services.circuit_breaker.time.monotonic", return_value=100.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def _open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_probe(self):
+        self._open()
+        self.clock.return_value = 130.0
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        # 試しのリクエストの結果が出るまでは他を通さない
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_neutral_keeps_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_neutral()
+        self.assertEqual(self.breaker.failures, 2)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_neutral_half_open_probe_closes(self):
+        self._open()
+        self.clock.return_value = 130.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_neutral()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_half_open_probe_failure_reopens(self):
+        self._open()
+        self.clock.return_value = 130.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.clock.return_value = 160.0
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_expires_without_result(self):
+        self._open()
+        self.clock.return_value = 130.0
+        self.assertTrue(self.breaker.allow())
+        self.clock.return_value = 159.0
+        self.assertFalse(self.breaker.allow())
+        self.clock.return_value = 160.0
+        self.assertTrue(self.breaker.allow())
+
+
+class RakutenGetTests(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        patcher = mock.patch.dict(external_api.BREAKERS, {"ichiba": self.breaker})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch("myapp.services.external_api.requests.get", side_effect=RuntimeError("boom"))
+    def test_unexpected_error_records_failure(self, _get):
+        self.breaker.state = HALF_OPEN
+        with self.assertRaises(RuntimeError):
+            external_api._rakuten_get("ichiba", external_api.ICHIBA_URL, {})
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def _http_error(self, status):
+        response = external_api.requests.Response()
+        response.status_code = status
+        return external_api.requests.exceptions.HTTPError(response=response)
+
+    @mock.patch("myapp.services.external_api.requests.get")
+    def test_client_error_does_not_reset_failures(self, get):
+        self.breaker.failure_threshold = 3
+        self.breaker.failures = 2
+        get.return_value.raise_for_status.side_effect = self._http_error(400)
+        with self.assertRaises(external_api.requests.exceptions.HTTPError):
+            external_api._rakuten_get("ichiba", external_api.ICHIBA_URL, {})
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CLOSED, 2))
+
+        get.return_value.raise_for_status.side_effect = self._http_error(503)
+        with self.assertRaises(external_api.requests.exceptions.HTTPError):
+            external_api._rakuten_get("ichiba", external_api.ICHIBA_URL, {})
+        self.assertEqual(self.breaker.state, OPEN)
+
+    @mock.patch("myapp.services.external_api.requests.get")
+    def test_refresh_reports_error_instead_of_stale(self, get):
+        get.side_effect = external_api.requests.exceptions.ConnectionError("down")
+        key = external_api.search_cache_key("ichiba", "nintendo", 5)
+        external_api.cache.set(f"{key}:stale", ["stale"])
+        self.addCleanup(external_api.cache.clear)
+
+        items, error = external_api.ichiba_item_search("nintendo", refresh=True)
+        self.assertEqual(items, [])
+        self.assertIsNotNone(error)
+
+        # ユーザーからの検索では stale を返す
+        items, error = external_api.ichiba_item_search("nintendo")
+        self.assertEqual((items, error), (["stale"], None))
+
+
+@override_settings(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=1.0, PROFILER_SLOW_THRESHOLD_MS=None)
+class RequestProfilerMiddlewareTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(PROFILER_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _call(self, user):
+        request = RequestFactory().get("/myapp/")
+        request.user = user or AnonymousUser()
+        profiling.RequestProfilerMiddleware(lambda r: HttpResponse())(request)
+        return profiling.list_entries()
+
+    def test_anonymous_requests_are_not_sampled(self):
+        self.assertEqual(self._call(None), [])
+
+    def test_staff_requests_are_sampled(self):
+        staff = User(username="staff", is_staff=True)
+        entries = self._call(staff)
+        self.assertEqual([(e["trigger"], e["has_profile"]) for e in entries], [("sample", True)])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        override = override_settings(METRICS_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.registry = metrics.Registry()
+        self.counter = self.registry.counter("test_total", "Test.", ["kind"])
+
+    def test_not_flushed_outside_server(self):
+        self.counter.inc(kind="a")
+        self.registry.maybe_flush()
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+    def test_dead_process_files_are_archived(self):
+        dead = {"test_total": {json.dumps(["a"]): 3}}
+        (self.dir / "999999999-deadbeef.json").write_text(json.dumps(dead))
+        self.counter.inc(2, kind="a")
+
+        for _ in range(2):
+            merged = self.registry.collect()
+            self.assertEqual(merged["test_total"], {json.dumps(["a"]): 5})
+        self.assertFalse((self.dir / "999999999-deadbeef.json").exists())
+        self.assertTrue((self.dir / metrics.ARCHIVE_FILE).exists())
+
+    @mock.patch("myapp.fileutils.os.replace", side_effect=OSError("disk full"))
+    def test_write_failure_is_logged(self, _replace):
+        self.counter.inc(kind="a")
+        with self.assertLogs("myapp.metrics", "ERROR"):
+            self.registry.flush()
+        # 一時ファイルは残さない
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+    def test_dead_process_files_kept_when_archive_fails(self):
+        dead_file = self.dir / "999999999-deadbeef.json"
+        dead_file.write_text(json.dumps({"test_total": {json.dumps(["a"]): 3}}))
+        with mock.patch("myapp.fileutils.os.replace", side_effect=OSError("disk full")), \
+                self.assertLogs("myapp.metrics", "ERROR"):
+            metrics._archive_dead_processes(self.dir)
+        self.assertTrue(dead_file.exists())
+        self.assertFalse((self.dir / metrics.ARCHIVE_LOCK).exists())
+
+    def test_unknown_method_label(self):
+        request = RequestFactory().generic("BREW", "/myapp/")
+        with mock.patch.object(metrics.view_duration_seconds, "observe") as observe:
+            metrics.MetricsMiddleware(lambda r: HttpResponse())(request)
+        self.assertEqual(observe.call_args.kwargs["method"], "other")
+
+
+@override_settings(METRICS_TOKEN="secret", METRICS_ALLOWED_IPS=[])
+class MetricsViewTests(TestCase):
+    def test_requires_token(self):
+        self.assertEqual(self.client.get("/internal/metrics/").status_code, 403)
+        response = self.client.get("/internal/metrics/", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get("/internal/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class KeywordTrackerTests(TestCase):
+    def test_flush_adds_counts(self):
+        SearchKeywordStat.objects.create(
+            endpoint="ichiba", keyword="nintendo", count=10, last_seen="2026-01-01T00:00Z"
+        )
+        tracker = KeywordTracker(capacity=10, flush_interval=3600)
+        for keyword in ("nintendo", "nintendo", "switch"):
+            tracker.record("ichiba", keyword)
+        tracker.record("games", "switch")
+        tracker.flush()
+
+        counts = dict(
+            SearchKeywordStat.objects.filter(endpoint="ichiba").values_list("keyword", "count")
+        )
+        self.assertEqual(counts, {"nintendo": 12, "switch": 1})
+        self.assertEqual(SearchKeywordStat.objects.get(endpoint="games").count, 1)
+
+    def test_flush_runs_in_background(self):
+        tracker = KeywordTracker(capacity=10, flush_interval=0)
+        with mock.patch("myapp.services.keyword_stats.threading.Thread") as thread:
+            tracker.record("ichiba", "nintendo")
+            tracker.record("ichiba", "nintendo")
+        # 反映中は次のスレッドを起動しない
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+    def test_keyword_is_normalized_before_cache_key(self):
+        self.addCleanup(external_api.cache.clear)
+        with mock.patch.object(external_api, "_fetch_ichiba_items", return_value=([], None)) as fetch:
+            external_api.ichiba_item_search("nintendo ")
+            external_api.ichiba_item_search("  nintendo")
+        fetch.assert_called_once_with("nintendo", 5)
+
+
+class AuthenticationBackendTests(TestCase):
+    def test_sessions_from_model_backend_stay_logged_in(self):
+        user = User.objects.create_user("alice", password="pw")
+        self.client.force_login(user, backend="django.contrib.auth.backends.ModelBackend")
+        response = self.client.get("/myapp/suggest/", {"endpoint": "ichiba", "q": "a"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_uses_profile_backend(self):
+        User.objects.create_user("alice", password="pw")
+        self.assertTrue(self.client.login(username="alice", password="pw"))
+        self.assertEqual(
+            self.client.session["_auth_user_backend"], "myapp.backends.ProfileModelBackend"
+        )
+
+    def test_signup_logs_in(self):
+        response = self.client.post(
+            "/myapp/signup/",
+            {"username": "bob", "password1": "s3cret-pass-123", "password2": "s3cret-pass-123"},
+        )
+        self.assertRedirects(response, "/myapp/dashboard/", fetch_redirect_response=False)
+        self.assertEqual(
+            self.client.session["_auth_user_backend"], "myapp.backends.ProfileModelBackend"
+        )
+
+
+class SharedCacheCheckTests(TestCase):
+    @override_settings(DEBUG=False)
+    def test_warns_on_locmem_in_production(self):
+        self.assertEqual([w.id for w in checks.check_shared_cache(None)], ["myapp.W001"])
+
+    @override_settings(
+        DEBUG=False,
+        CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://localhost",
+        }},
+    )
+    def test_shared_cache_is_fine(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class ExportDataCommandTests(TestCase):
+    def test_writes_to_command_stdout(self):
+        user = User.objects.create_user("alice")
+        out = StringIO()
+        call_command("export_data", "leaderboard", stdout=out)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            ["rank,user_id,username,points", f"1,{user.id},alice,0"],
+        )
+
+
+class MissionAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="pw")
+        self.client.force_login(self.admin)
+        self.alice = User.objects.create_user("alice")
+        self.alicia = User.objects.create_user("alicia")
+        for user in (self.alice, self.alicia):
+            for day in (datetime.date(2025, 11, 30), datetime.date(2026, 1, 2)):
+                UserDailyMission.objects.create(user=user, date=day, mission_type="ichiba")
+
+    def test_changelist_does_not_scan_for_date_hierarchy(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/myapp/userdailymission/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q["sql"] for q in queries if "DISTINCT" in q["sql"]])
+        # MIN / MAX の範囲から年のリンクを作る
+        self.assertContains(response, "?date__year=2025")
+        self.assertContains(response, "?date__year=2026")
+
+    def test_date_hierarchy_drilldown(self):
+        response = self.client.get("/admin/myapp/userdailymission/", {"date__year": "2026"})
+        self.assertContains(response, "date__month=1")
+        self.assertNotContains(response, "date__month=2")
+        response = self.client.get(
+            "/admin/myapp/userdailymission/", {"date__year": "2026", "date__month": "1"}
+        )
+        self.assertContains(response, "date__day=2")
+        self.assertNotContains(response, "date__day=3")
+
+    def test_search_is_exact_username_match(self):
+        response = self.client.get("/admin/myapp/userdailymission/", {"q": "alice"})
+        self.assertEqual(
+            {m.user_id for m in response.context["cl"].result_list}, {self.alice.id}
+        )
+        UserProfile.objects.create(user=self.alicia)
+        response = self.client.get("/admin/myapp/userprofile/", {"q": "alic"})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        User.objects.bulk_create(User(username=f"user{i}") for i in range(5))
+
+    def test_filtered_count_is_capped(self):
+        qs = User.objects.filter(username__startswith="user").order_by("username")
+        paginator = EstimatedCountPaginator(qs, 2)
+        paginator.count_limit = 3
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        self.assertNotIn("ORDER BY", queries[0]["sql"])
+        self.assertEqual(EstimatedCountPaginator(qs, 2).count, 5)
+
+    def test_unfiltered_count_uses_estimate(self):
+        paginator = EstimatedCountPaginator(User.objects.order_by("pk"), 2)
+        paginator.count_limit = 3
+        # SQLite では最大 ID を件数とみなす
+        self.assertEqual(paginator.count, User.objects.order_by("-pk")[0].pk)
+
+
+class PrefixIndexTests(TestCase):
+    def test_prefix_match_ordered_by_weight(self):
+        index = PrefixIndex(100)
+        index.add("Nintendo Switch")
+        index.add("nintendo", weight=5)
+        index.add("Nikon")
+        index.add("Sony")
+        self.assertEqual(index.suggest("nin"), ["nintendo", "Nintendo Switch"])
+        self.assertEqual(index.suggest("ni", limit=1), ["nintendo"])
+        self.assertEqual(index.suggest(""), [])
+
+    def test_nfkc_and_case_folding(self):
+        index = PrefixIndex(100)
+        index.add("ＰｌａｙＳｔａｔｉｏｎ ５")
+        self.assertEqual(index.suggest("playstation 5"), ["ＰｌａｙＳｔａｔｉｏｎ ５"])
+        index.add("PLAYSTATION 5")
+        # 正規化後が同じなら 1 件にまとめる
+        self.assertEqual(len(index), 1)
+
+    def test_capacity_is_bounded(self):
+        index = PrefixIndex(4)
+        for i in range(50):
+            index.add(f"item{i:02d}")
+        self.assertLessEqual(len(index), 5)
+
+    def test_new_entries_survive_compaction(self):
+        index = PrefixIndex(4)
+        for key in ("old1", "old2", "old3", "old4"):
+            index.add(key)
+        for i in range(6):
+            index.add(f"new{i}")
+        self.assertEqual(index.suggest("new"), ["new5", "new4", "new3", "new2"])
+
+    def test_old_heavy_entries_decay(self):
+        index = PrefixIndex(4)
+        for key in ("old1", "old2", "old3", "old4"):
+            index.add(key, weight=5)
+        for round_ in range(5):
+            for i in range(2):
+                index.add(f"new{round_}{i}")
+        self.assertTrue(index.suggest("new"))
+
+
+class AutocompleteTests(TestCase):
+    def test_seeded_from_keyword_stats(self):
+        SearchKeywordStat.objects.create(
+            endpoint="books", keyword="harry potter", count=10, last_seen="2026-01-01T00:00Z"
+        )
+        autocomplete = Autocomplete(capacity=100)
+        autocomplete.add_titles("books", ["Harry Potter and the Philosopher's Stone"])
+        self.assertEqual(
+            autocomplete.suggest("books", "Harry"),
+            ["harry potter", "Harry Potter and the Philosopher's Stone"],
+        )
+        self.assertEqual(autocomplete.suggest("ichiba", "Harry"), [])
+        self.assertEqual(autocomplete.suggest("unknown", "Harry"), [])
+
+    def test_search_forms_are_wired(self):
+        self.client.force_login(User.objects.create_user("alice"))
+        response = self.client.get("/myapp/api_test/")
+        for endpoint in ("ichiba", "books", "games"):
+            self.assertContains(response, f'data-endpoint="{endpoint}"')
+            self.assertContains(response, f'<datalist id="{endpoint}-suggestions">')
+
+
+class RakutenRedirectGuardTests(TestCase):
+    URL = "/myapp/go/rakuten/"
+
+    def setUp(self):
+        click_guard.cache.clear()
+        self.addCleanup(click_guard.cache.clear)
+        self.user = User.objects.create_user("alice", password="pw")
+        self.client.force_login(self.user)
+        # ウィンドウの切り替わりで結果が変わらないよう時刻を固定する
+        patcher = mock.patch("myapp.services.click_guard.time.time", return_value=6000.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _click(self, mission="ichiba"):
+        return self.client.get(self.URL, {"url": "https://www.rakuten.co.jp/", "mission": mission})
+
+    def test_repeat_click_on_completed_mission_is_one_query(self):
+        self._click()
+        self.assertEqual(UserProfile.objects.get(user=self.user).points, 1)
+        # 残るのは認証ミドルウェアによるユーザーの読み込みだけ
+        with self.assertNumQueries(1):
+            response = self._click()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(UserProfile.objects.get(user=self.user).points, 1)
+
+    def test_new_completion_invalidates_mission_fragments(self):
+        today = timezone.localdate()
+        keys = [
+            make_template_fragment_key(name, [self.user.id, today])
+            for name in ("dashboard_missions", "dashboard_score", "api_test_missions")
+        ]
+        self.addCleanup(cache.delete_many, keys)
+        # 画面を表示してフラグメントをキャッシュさせる
+        self.client.get("/myapp/dashboard/")
+        self.client.get("/myapp/api_test/")
+        self.assertEqual(len(cache.get_many(keys)), len(keys))
+
+        self._click()
+        self.assertEqual(cache.get_many(keys), {})
+        # 表示し直すと新しいポイントが出る
+        response = self.client.get("/myapp/dashboard/")
+        self.assertEqual(response.context["user_points"], 1)
+        self.assertIn(keys[1], cache.get_many(keys))
+
+    def test_repeat_click_keeps_mission_fragments(self):
+        self._click()
+        self.client.get("/myapp/dashboard/")
+        key = make_template_fragment_key("dashboard_score", [self.user.id, timezone.localdate()])
+        self.addCleanup(cache.delete, key)
+        self._click()
+        self.assertIsNotNone(cache.get(key))
+
+    def test_click_over_limit_is_throttled(self):
+        limit = click_guard.click_rate_limiter.limit
+        with mock.patch("myapp.views.is_mission_done", return_value=False):
+            for _ in range(limit):
+                self._click()
+            UserDailyMission.objects.all().delete()
+            with self.assertNumQueries(1):
+                response = self._click()
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(UserDailyMission.objects.exists())
+
+
+class SlidingWindowRateLimiterTests(TestCase):
+    def setUp(self):
+        click_guard.cache.clear()
+        self.addCleanup(click_guard.cache.clear)
+        patcher = mock.patch("myapp.services.click_guard.time.time")
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = click_guard.SlidingWindowRateLimiter("test_rate", limit=10, window=60)
+
+    def _allowed(self, n):
+        return sum(self.limiter.hit("u1") for _ in range(n))
+
+    def test_limit_within_window(self):
+        self.clock.return_value = 600.0
+        self.assertEqual(self._allowed(12), 10)
+        # 別のユーザーには影響しない
+        self.assertTrue(self.limiter.hit("u2"))
+
+    def test_previous_window_is_weighted(self):
+        self.clock.return_value = 600.0
+        self.assertEqual(self._allowed(10), 10)
+        # 次のウィンドウの半分経過: 前ウィンドウの 10 回は 5 回分として数える
+        self.clock.return_value = 690.0
+        self.assertEqual(self._allowed(10), 5)
+
+    def test_previous_window_fully_expires(self):
+        self.clock.return_value = 600.0
+        self._allowed(10)
+        self.clock.return_value = 720.0
+        self.assertEqual(self._allowed(12), 10)
+
+
+class MissionDoneCacheTests(TestCase):
+    @override_settings(TIME_ZONE="Asia/Tokyo")
+    def test_expires_at_local_midnight(self):
+        tokyo = datetime.timezone(datetime.timedelta(hours=9))
+        now = datetime.datetime(2026, 10, 19, 23, 59, 30, tzinfo=tokyo)
+        with mock.patch("myapp.services.click_guard.timezone.localtime", return_value=now), \
+                mock.patch.object(click_guard.cache, "set") as cache_set:
+            click_guard.mark_mission_done(1, now.date(), "ichiba")
+        key, _value, timeout = cache_set.call_args.args
+        self.assertEqual(key, "mission_done:1:2026-10-19:ichiba")
+        self.assertEqual(timeout, 30)
+
+
+def _hotels(*hotel_nos, review=4.5, name="Hotel"):
+    return [
+        HotelRecord(rank=i, hotelNo=no, hotelName=f"{name} {no}", middleClassName="Tokyo", reviewAverage=review)
+        for i, no in enumerate(hotel_nos, start=1)
+    ]
+
+
+class HotelHistoryTests(TestCase):
+    def _age_snapshots(self, days):
+        HotelRankingSnapshot.objects.update(
+            fetched_at=timezone.now() - datetime.timedelta(days=days)
+        )
+
+    def test_identical_ranking_is_stored_once(self):
+        hotel_history.record_snapshot("all", _hotels(1, 2, 3))
+        hotel_history.record_snapshot("all", _hotels(1, 2, 3))
+        self.assertEqual(HotelRankingSnapshot.objects.count(), 1)
+        self.assertEqual(HotelRankingEntry.objects.count(), 3)
+
+        # 評価が変わったら新しいスナップショット。ジャンルが違っても別扱い
+        hotel_history.record_snapshot("all", _hotels(1, 2, 3, review=4.6))
+        hotel_history.record_snapshot("onsen", _hotels(1, 2, 3))
+        self.assertEqual(HotelRankingSnapshot.objects.count(), 3)
+
+    def test_hotels_are_upserted(self):
+        hotel_history.record_snapshot("all", _hotels(1, 2))
+        hotel_history.record_snapshot("all", _hotels(2, 1, name="Renamed"))
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertEqual(Hotel.objects.get(hotel_no=1).name, "Renamed 1")
+
+    def test_rows_without_hotel_no_are_skipped(self):
+        items = _hotels(1) + [HotelRecord(rank=2, hotelNo=None, hotelName="?")]
+        hotel_history.record_snapshot("all", items)
+        self.assertEqual(HotelRankingEntry.objects.count(), 1)
+
+    def test_database_error_is_logged(self):
+        with mock.patch.object(HotelRankingSnapshot.objects, "create", side_effect=DatabaseError("x")), \
+                self.assertLogs("myapp.services.hotel_history", "ERROR"):
+            hotel_history.record_snapshot("all", _hotels(1))
+        self.assertFalse(HotelRankingSnapshot.objects.exists())
+
+    def test_rank_changes_since_yesterday(self):
+        hotel_history.record_snapshot("all", _hotels(1, 2, 3))
+        self._age_snapshots(1)
+        # 今日の分は比較の基準にならない
+        hotel_history.record_snapshot("all", _hotels(3, 1, 2))
+
+        today = _hotels(3, 1, 4, 2)
+        baseline, changes = hotel_history.rank_changes("all", today)
+        self.assertEqual(baseline, HotelRankingSnapshot.objects.order_by("fetched_at")[0].id)
+        # 3: 3位→1位, 1: 1位→2位, 4: 新規, 2: 2位→4位
+        self.assertEqual(changes, [2, -1, None, -2])
+
+    def test_rank_changes_without_baseline(self):
+        hotel_history.record_snapshot("all", _hotels(1, 2))
+        self.assertEqual(hotel_history.rank_changes("all", _hotels(1, 2)), (None, [None, None]))
+
+    def test_rank_history(self):
+        now = timezone.now()
+        for days_ago, order in ((40, (1, 2)), (2, (2, 1)), (0, (1, 2))):
+            hotel_history.record_snapshot("all", _hotels(*order))
+            HotelRankingSnapshot.objects.filter(pk=HotelRankingSnapshot.objects.latest("pk").pk).update(
+                fetched_at=now - datetime.timedelta(days=days_ago)
+            )
+        hotel_history.record_snapshot("onsen", _hotels(1))
+
+        history = hotel_history.rank_history(1, "all", days=30)
+        self.assertEqual([(rank, review) for _at, rank, review in history], [(2, 4.5), (1, 4.5)])
+        self.assertEqual(len(hotel_history.rank_history(1, "all", days=60)), 3)
+
+
+class RankingSnapshotTests(TestCase):
+    def test_every_rendered_field_changes_the_snapshot(self):
+        hotel = {"rank": 1, "hotelNo": 1, "hotelName": "Hotel 1", "reviewAverage": 4.5}
+        snapshot = ranking_snapshot([HotelRecord(**hotel)])
+        self.assertEqual(ranking_snapshot([HotelRecord(**hotel)]), snapshot)
+        for field in ("hotelThumbnailUrl", "hotelInformationUrl", "middleClassName", "reviewCount"):
+            with self.subTest(field=field):
+                changed = HotelRecord(**{**hotel, field: "changed"})
+                self.assertNotEqual(ranking_snapshot([changed]), snapshot)
+
+
+class RecordTests(TestCase):
+    def test_pickle_round_trip(self):
+        item = ItemRecord("Switch", "https://item.rakuten.co.jp/a", 32978, "shop", "https://thumbnail.image.rakuten.co.jp/a.jpg")
+        hotel = _hotels(7)[0]
+        for record in (item, hotel):
+            restored = pickle.loads(pickle.dumps(record))
+            self.assertIs(type(restored), type(record))
+            self.assertEqual(restored, record)
+            self.assertEqual(hash(restored), hash(record))
+        # キャッシュには値のタプルだけが入る（属性名の dict は持たない）
+        self.assertFalse(hasattr(item, "__dict__"))
+
+    def test_immutable(self):
+        item = ItemRecord(itemName="Switch")
+        with self.assertRaises(AttributeError):
+            item.itemName = "PS5"
+        with self.assertRaises(AttributeError):
+            del item.itemName
+        with self.assertRaises(AttributeError):
+            item.extra = 1
+
+    def test_from_ichiba(self):
+        item = ItemRecord.from_ichiba({
+            "itemName": "Switch",
+            "itemUrl": "https://item.rakuten.co.jp/a",
+            "itemPrice": 32978,
+            "shopName": "shop",
+            "mediumImageUrls": [{"imageUrl": "https://thumbnail.image.rakuten.co.jp/a.jpg"}],
+            "unused": "x" * 1000,
+        })
+        self.assertEqual(
+            item,
+            ItemRecord("Switch", "https://item.rakuten.co.jp/a", 32978, "shop", "https://thumbnail.image.rakuten.co.jp/a.jpg"),
+        )
+
+    def test_from_books_for_games(self):
+        # ゲームズは itemName ではなく title、itemPrice ではなく itemPriceTaxIncl で返ることがある
+        item = ItemRecord.from_books({
+            "title": "Zelda",
+            "itemUrl": "https://books.rakuten.co.jp/z",
+            "itemPriceTaxIncl": 7678,
+            "largeImageUrl": "https://thumbnail.image.rakuten.co.jp/z.jpg",
+        })
+        self.assertEqual(item.itemName, "Zelda")
+        self.assertEqual(item.itemPrice, 7678)
+        self.assertEqual(item.shopName, "")
+        self.assertEqual(item.imageUrl, "https://thumbnail.image.rakuten.co.jp/z.jpg")
+
+        item = ItemRecord.from_books({"itemName": "Book", "title": "ignored", "itemPrice": 500})
+        self.assertEqual((item.itemName, item.itemPrice, item.itemUrl), ("Book", 500, ""))
+
+    def test_first_image_url_shapes(self):
+        self.assertEqual(_first_image_url([{"imageUrl": "a.jpg"}, {"imageUrl": "b.jpg"}]), "a.jpg")
+        self.assertEqual(_first_image_url(["a.jpg", "b.jpg"]), "a.jpg")
+        self.assertEqual(_first_image_url([]), "")
+        self.assertEqual(_first_image_url(None), "")
+
+
+class PrecompressedStorageTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.storage = PrecompressedManifestStaticFilesStorage(location=tmp.name, base_url="/static/")
+
+    def _collect(self, files):
+        for name, data in files.items():
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        paths = {name: (self.storage, name) for name in files}
+        list(self.storage.post_process(paths))
+        return json.loads((self.root / self.storage.manifest_name).read_text())["paths"]
+
+    def test_webp_variants_are_in_manifest(self):
+        manifest = self._collect({"img/hotel.png": _png(400, 200)})
+        # 元画像より大きい 640px は作らず、元の幅（400px）で作る
+        for width in (160, 320, 400):
+            variant = f"img/hotel.w{width}.webp"
+            self.assertIn(variant, manifest)
+            self.assertTrue((self.root / manifest[variant]).is_file())
+        self.assertNotIn("img/hotel.w640.webp", manifest)
+        with Image.open(self.root / manifest["img/hotel.w160.webp"]) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (160, 80)))
+
+    def test_compressed_only_when_smaller(self):
+        manifest = self._collect({
+            "css/large.css": b"body { margin: 0; padding: 0; }\n" * 200,
+            "css/tiny.css": b"a{}",
+        })
+        large = self.root / manifest["css/large.css"]
+        self.assertTrue(Path(f"{large}.gz").is_file())
+        self.assertTrue(Path(f"{large}.br").is_file())
+        tiny = self.root / manifest["css/tiny.css"]
+        self.assertFalse(Path(f"{tiny}.gz").exists())
+        self.assertFalse(Path(f"{tiny}.br").exists())
+
+
+class ServeStaticTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        for name, data in (
+            ("app.0123456789ab.css", b"css"),
+            ("app.0123456789ab.css.br", b"br"),
+            ("app.0123456789ab.css.gz", b"gz"),
+            ("app.css", b"css"),
+        ):
+            (root / name).write_bytes(data)
+        self.mtime = (root / "app.css").stat().st_mtime
+        override = override_settings(STATIC_ROOT=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(
+            static_serve, "_hashed_names", return_value=frozenset({"app.0123456789ab.css"})
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, path, **headers):
+        request = RequestFactory().get(f"/static/{path}", headers=headers)
+        return static_serve.serve_static(request, path)
+
+    def _body(self, response):
+        body = b"".join(response.streaming_content)
+        response.close()
+        return body
+
+    def test_encoding_negotiation(self):
+        for accept, encoding, body in (
+            ("gzip, deflate, br", "br", b"br"),
+            ("gzip", "gzip", b"gz"),
+            ("br;q=0, gzip", "gzip", b"gz"),
+            ("", None, b"css"),
+        ):
+            with self.subTest(accept=accept):
+                response = self._get("app.0123456789ab.css", accept_encoding=accept)
+                self.assertEqual(response.headers.get("Content-Encoding"), encoding)
+                self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+                self.assertEqual(response.headers["Content-Type"], "text/css")
+                self.assertEqual(self._body(response), body)
+
+    def test_cache_control(self):
+        response = self._get("app.0123456789ab.css")
+        self._body(response)
+        self.assertEqual(response.headers["Cache-Control"], static_serve.IMMUTABLE_CACHE_CONTROL)
+        response = self._get("app.css")
+        self._body(response)
+        self.assertEqual(response.headers["Cache-Control"], static_serve.DEFAULT_CACHE_CONTROL)
+
+    def test_not_modified_keeps_cache_headers(self):
+        for path, cache_control in (
+            ("app.0123456789ab.css", static_serve.IMMUTABLE_CACHE_CONTROL),
+            ("app.css", static_serve.DEFAULT_CACHE_CONTROL),
+        ):
+            with self.subTest(path=path):
+                response = self._get(path, if_modified_since=http_date(self.mtime))
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.headers["Cache-Control"], cache_control)
+                self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+
+    def test_path_outside_root_is_404(self):
+        with self.assertRaises(Http404):
+            self._get("../secret.txt")
@@ -12,6 +12,9 @@ from .views import (
     BooksSearchView,
     GamesSearchView,
     HotelRankingView,
+    hotel_rank_history,
+    image_proxy,
+    suggest_view,
 )
 
 app_name = "myapp"
@@ -26,7 +29,10 @@ urlpatterns = [
     path("books/", BooksSearchView.as_view(), name="books_search"),
     path("games/", GamesSearchView.as_view(), name="games_search"),
     path("hotels/", HotelRankingView.as_view(), name="hotel_ranking"),
+    path("hotels/<int:hotel_no>/history/", hotel_rank_history, name="hotel_rank_history"),
     path("api_test/", ApiTestView.as_view(), name="api_test"),
     path("go/rakuten/", RakutenRedirectView.as_view(), name="rakuten_redirect"),
     path("ranking/", RankingView.as_view(), name="ranking"),
+    path("img/", image_proxy, name="image_proxy"),
+    path("suggest/", suggest_view, name="suggest"),
 ]
\ No newline at end of file
@@ -2,16 +2,25 @@
 from django.views import View
 from django.views.generic import TemplateView
 from django.shortcuts import redirect, render
-from django.http import Http404
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth import get_user_model, login as auth_login, logout as auth_logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_GET
 
 
+from .metrics import mission_clicks_total, mission_completions_total, registry as metrics_registry
 from .models import UserDailyMission, MISSION_CHOICES, UserProfile
 from .services.external_api import ichiba_item_search, books_search, games_search, hotel_ranking
+from .services.fragment_cache import invalidate_mission_fragments, ranking_snapshot
+from .services.autocomplete import autocomplete
+from .services.click_guard import click_rate_limiter, is_mission_done, mark_mission_done
+from .services.hotel_history import rank_changes, rank_history
+from .services.image_proxy import IMAGE_PROXY_WIDTHS, ImageProxyError, get_image, is_allowed_url
 from .forms import SimpleSignUpForm
 
 User = get_user_model()
@@ -26,6 +35,22 @@ POINTS_PER_MISSION = {
 # bonus points for completing all daily missions
 DAILY_MISSION_BONUS = 5
 
+# browser cache lifetime for proxied images (7 days)
+IMAGE_PROXY_MAX_AGE = 60 * 60 * 24 * 7
+
+
+def get_profile(user):
+    """
+    ユーザーのプロフィールを返す（無ければ作成）。
+    ProfileModelBackend が user と一緒に読み込んでいれば追加のクエリは発生しない。
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
+
 
 class ApiTestView(LoginRequiredMixin, TemplateView):
     """
@@ -62,12 +87,13 @@ class ApiTestView(LoginRequiredMixin, TemplateView):
             for m in qs:
                 missions[m.mission_type] = m.completed
 
-            profile, _ = UserProfile.objects.get_or_create(user=self.request.user)
+            profile = get_profile(self.request.user)
             context["user_points"] = profile.points
         else:
             context["user_points"] = 0
 
         context["mission_status"] = missions
+        context["mission_date"] = today
         return context
 
     def post(self, request, *args, **kwargs):
@@ -125,6 +151,9 @@ class RakutenRedirectView(LoginRequiredMixin, View):
     ・該当ミッションを completed=True にする
     ・そのミッションを初めて達成したときに基本ポイントを付与
     ・3種類すべて completed になった日に初めてボーナスを付与
+
+    達成済みと分かっているクリックと、短時間に繰り返されたクリックは
+    キャッシュだけで判定して DB には触らずにリダイレクトする。
     """
 
     def get(self, request, *args, **kwargs):
@@ -138,6 +167,19 @@ class RakutenRedirectView(LoginRequiredMixin, View):
 
         if mission_type in mission_codes and request.user.is_authenticated:
             today = timezone.localdate()
+            user_id = request.user.id
+
+            # ⓪ 今日すでに達成済みならここで終わり（キャッシュ 1 回で済む）
+            if is_mission_done(user_id, today, mission_type):
+                mission_clicks_total.inc(mission_type=mission_type, result="already_done")
+                return redirect(url)
+
+            # 連打・スクリプトによるクリックはミッション処理をしない
+            if not click_rate_limiter.hit(user_id):
+                mission_clicks_total.inc(mission_type=mission_type, result="throttled")
+                return redirect(url)
+
+            mission_clicks_total.inc(mission_type=mission_type, result="processed")
 
             # ① 今日のそのミッションを completed=True にする
             mission, created = UserDailyMission.objects.get_or_create(
@@ -163,10 +205,11 @@ class RakutenRedirectView(LoginRequiredMixin, View):
                 newly_completed = True
 
             # プロフィール取得（ポイント管理用）
-            profile, _ = UserProfile.objects.get_or_create(user=request.user)
+            profile = get_profile(request.user)
 
             # ② 初めて達成したミッションには基本ポイントを付与
             if newly_completed:
+                mission_completions_total.inc(mission_type=mission_type)
                 base_point = POINTS_PER_MISSION.get(mission_type, 0)
                 if base_point > 0:
                     profile.add_points(base_point)
@@ -191,6 +234,13 @@ class RakutenRedirectView(LoginRequiredMixin, View):
                 profile.last_mission_bonus_date = today
                 profile.save(update_fields=["last_mission_bonus_date"])
 
+            # ⑤ ミッション状況・ポイントのフラグメントキャッシュを破棄
+            if newly_completed:
+                invalidate_mission_fragments(user_id, today)
+
+            # ⑥ 次回以降のクリックは ⓪ で済ませる
+            mark_mission_done(user_id, today, mission_type)
+
         return redirect(url)
 
     
@@ -246,9 +296,10 @@ class BaseMissionView(LoginRequiredMixin, TemplateView):
         for m in qs:
             missions[m.mission_type] = m.completed
 
-        profile, _ = UserProfile.objects.get_or_create(user=self.request.user)
+        profile = get_profile(self.request.user)
         context.setdefault("user_points", profile.points)
         context.setdefault("mission_status", missions)
+        context.setdefault("mission_date", today)
         return context
 
 
@@ -328,9 +379,15 @@ class HotelRankingView(BaseMissionView):
 
         items, error_message = hotel_ranking(genre=genre)
 
+        # 昨日からの順位変化（DB のスナップショットから引くので API は呼ばない）
+        rank_baseline, changes = rank_changes(genre, items)
+
         context.setdefault("items", items)
+        context.setdefault("hotel_rows", list(zip(items, changes)))
+        context.setdefault("rank_baseline", rank_baseline)
         context.setdefault("error_message", error_message)
         context.setdefault("selected_genre", genre)
+        context.setdefault("ranking_snapshot", ranking_snapshot(items))
 
         return self._add_mission_context(context)
 
@@ -343,7 +400,8 @@ def signup_view(request):
         form = SimpleSignUpForm(request.POST)
         if form.is_valid():
             user = form.save()       # saves username + password in database
-            auth_login(request, user)
+            # バックエンドが複数あるので、どれでログインしたかを指定する
+            auth_login(request, user, backend="myapp.backends.ProfileModelBackend")
             return redirect("myapp:dashboard")
     else:
         form = SimpleSignUpForm()
@@ -382,7 +440,7 @@ def dashboard(request):
     total_missions = len(MISSION_CHOICES)
 
     # ユーザープロフィール取得
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
+    profile = get_profile(request.user)
     
     rank = get_user_rank(profile.points)
 
@@ -404,6 +462,7 @@ def dashboard(request):
         "completed_mission_num": completed_mission_num, 
         "total_missions": total_missions, 
         "rank": rank,
+        "mission_date": today,
     }
     return render(request, "myapp/dashboard.html", context)
 
@@ -417,4 +476,90 @@ def logout_view(request):
         auth_logout(request)
         return redirect("myapp:login")
     # GETで来た場合はダッシュボードに戻す（直接叩かれたとき用）
-    return redirect("myapp:dashboard")
\ No newline at end of file
+    return redirect("myapp:dashboard")
+
+
+@login_required(login_url="myapp:login")
+@require_GET
+def image_proxy(request):
+    """
+    楽天 CDN の画像を縮小・キャッシュして返す。
+    取得・変換の負荷がかかるので、ログインユーザーのみ（使っているページもログイン必須）。
+    例: /myapp/img/?url=https://img.travel.rakuten.co.jp/...&w=80
+    """
+    url = request.GET.get("url", "")
+    try:
+        width = int(request.GET.get("w", ""))
+    except ValueError:
+        raise Http404("w パラメータが不正です")
+
+    if width not in IMAGE_PROXY_WIDTHS or not is_allowed_url(url):
+        raise Http404("対応していない画像です")
+
+    try:
+        data, key = get_image(url, width)
+    except ImageProxyError:
+        # 取得・変換に失敗したときは元画像を直接表示させる
+        return redirect(url)
+
+    etag = f'"{key}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(data, content_type="image/webp")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"public, max-age={IMAGE_PROXY_MAX_AGE}"
+    return response
+
+
+@login_required(login_url="myapp:login")
+@require_GET
+def hotel_rank_history(request, hotel_no):
+    """
+    ホテルの順位推移（保存済みスナップショットから返す）。
+    例: /myapp/hotels/12345/history/?genre=onsen&days=30
+    """
+    genre = request.GET.get("genre", "all")
+    try:
+        days = min(max(int(request.GET.get("days", 30)), 1), 365)
+    except ValueError:
+        days = 30
+    history = [
+        {"fetched_at": fetched_at.isoformat(), "rank": rank, "review_average": review_average}
+        for fetched_at, rank, review_average in rank_history(hotel_no, genre, days)
+    ]
+    return JsonResponse({"hotel_no": hotel_no, "genre": genre, "history": history})
+
+
+@login_required(login_url="myapp:login")
+@require_GET
+def suggest_view(request):
+    """
+    検索フォームの入力補完。楽天 API は呼ばず、プロセス内のインデックスだけを引く。
+    例: /myapp/suggest/?endpoint=ichiba&q=nin
+    """
+    endpoint = request.GET.get("endpoint", "")
+    prefix = request.GET.get("q", "")
+    return JsonResponse({"suggestions": autocomplete.suggest(endpoint, prefix)})
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus 用のメトリクス（全ワーカープロセス分を合算）。
+    次のいずれかのときだけ許可する。
+    ・Authorization: Bearer <METRICS_TOKEN>
+    ・METRICS_ALLOWED_IPS からのアクセス
+    ・スタッフ
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    allowed = (
+        bool(token) and constant_time_compare(authorization, f"Bearer {token}")
+    ) or request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics_registry.exposition(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
\ No newline at end of file
@@ -0,0 +1,37 @@
+// 検索フォームの入力補完
+// <input data-suggest-url="..." data-endpoint="ichiba" list="..."> に候補を出す
+document.addEventListener("DOMContentLoaded", function () {
+	document.querySelectorAll("input[data-suggest-url]").forEach(function (input) {
+		const datalist = document.getElementById(input.getAttribute("list"));
+		if (!datalist) return;
+
+		let timer = null;
+		let lastQuery = "";
+
+		input.addEventListener("input", function () {
+			clearTimeout(timer);
+			timer = setTimeout(function () {
+				const q = input.value.trim();
+				if (!q || q === lastQuery) return;
+				lastQuery = q;
+
+				const params = new URLSearchParams({ endpoint: input.dataset.endpoint, q: q });
+				fetch(input.dataset.suggestUrl + "?" + params.toString(), {
+					headers: { Accept: "application/json" },
+				})
+					.then(function (res) {
+						return res.ok ? res.json() : { suggestions: [] };
+					})
+					.then(function (data) {
+						datalist.replaceChildren();
+						data.suggestions.forEach(function (text) {
+							const option = document.createElement("option");
+							option.value = text;
+							datalist.appendChild(option);
+						});
+					})
+					.catch(function () {});
+			}, 120);
+		});
+	});
+});